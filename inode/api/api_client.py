@@ -1,14 +1,24 @@
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from api import http_client
+from utils.layout import base
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s:%(levelname)s - %(message)s"
 )
 
+CONCURRENT_PAGES = base["REWARD_TRACKING"]["CONCURRENT_PAGES"]
+
+_page_executor = ThreadPoolExecutor(
+    max_workers=CONCURRENT_PAGES, thread_name_prefix="blocks"
+)
+
 
 def fetch_block(api_url):
     try:
-        response = requests.get(api_url)
+        response = http_client.get(api_url)
         response.raise_for_status()
         data = response.json()
         return data
@@ -23,30 +33,19 @@ def fetch_block(api_url):
     return None
 
 
+def fetch_blocks(api_urls):
+    # Fetched concurrently, returned in the order of api_urls
+    return list(_page_executor.map(fetch_block, api_urls))
+
+
 def test_api_connection(url):
-    try:
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()
-        logging.info(f"Successfully connected to API at {url}")
-        return True
-    except requests.ConnectionError:
-        logging.error(f"Failed to connect to API at {url}. Connection error.")
-    except requests.Timeout:
-        logging.error(f"Timeout occurred while connecting to API at {url}.")
-    except requests.HTTPError as http_err:
-        logging.error(
-            f"HTTP error occurred while connecting to API at {url}: {http_err}"
-        )
-    except Exception as e:
-        logging.error(
-            f"An unexpected error occurred while connecting to API at {url}: {e}"
-        )
-    return False
+    # Answered from the shared client's health cache while it is fresh
+    return http_client.check_health(url)
 
 
 def fetch_validators(validators):
     try:
-        response = requests.get(validators)
+        response = http_client.get(validators)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.HTTPError as errh:
@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.layout import base
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s:%(levelname)s - %(message)s"
+)
+
+TIMEOUT = base["HTTP_CLIENT"]["TIMEOUT"]
+POOL_SIZE = base["HTTP_CLIENT"]["POOL_SIZE"]
+HEALTH_TTL = base["HTTP_CLIENT"]["HEALTH_TTL"]
+
+# One keep-alive session for every API call. Idempotent requests are retried
+# on connection errors and 429/5xx replies with exponential backoff.
+_retry = Retry(
+    total=base["HTTP_CLIENT"]["RETRIES"],
+    backoff_factor=base["HTTP_CLIENT"]["BACKOFF"],
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset(["GET", "HEAD"]),
+    raise_on_status=False,
+)
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_maxsize=POOL_SIZE, max_retries=_retry))
+session.mount("https://", HTTPAdapter(pool_maxsize=POOL_SIZE, max_retries=_retry))
+
+# url -> (checked_at, healthy)
+_health = {}
+_health_lock = threading.Lock()
+
+
+def get(url, **kwargs):
+    kwargs.setdefault("timeout", TIMEOUT)
+    return session.get(url, **kwargs)
+
+
+def cached_health(url):
+    with _health_lock:
+        entry = _health.get(url)
+    if entry is None or time.monotonic() - entry[0] >= HEALTH_TTL:
+        return None
+    return entry[1]
+
+
+def check_health(url):
+    healthy = cached_health(url)
+    if healthy is not None:
+        return healthy
+
+    healthy = False
+    try:
+        response = get(url)
+        response.raise_for_status()
+        logging.info(f"Successfully connected to API at {url}")
+        healthy = True
+    except requests.ConnectionError:
+        logging.error(f"Failed to connect to API at {url}. Connection error.")
+    except requests.Timeout:
+        logging.error(f"Timeout occurred while connecting to API at {url}.")
+    except requests.HTTPError as http_err:
+        logging.error(
+            f"HTTP error occurred while connecting to API at {url}: {http_err}"
+        )
+    except Exception as e:
+        logging.error(
+            f"An unexpected error occurred while connecting to API at {url}: {e}"
+        )
+
+    with _health_lock:
+        _health[url] = (time.monotonic(), healthy)
+    return healthy
@@ -0,0 +1,215 @@
+# Every index the iNode relies on, applied idempotently at startup by
+# ensure_indexes(). An index whose options changed (e.g. made unique) is
+# dropped and recreated; if the new one cannot be built the old one is put back.
+#
+# Run from the inode directory:
+#   python3 -m database.indexes            apply the registry
+#   python3 -m database.indexes --explain  show the plan of every hot query
+import argparse
+import logging
+import sys
+
+from pymongo.errors import OperationFailure
+
+from database.mongodb import db
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s:%(levelname)s - %(message)s"
+)
+
+# Server codes for an existing index with the same keys but other options
+INDEX_CONFLICT_CODES = (85, 86)
+# Options carried over when an index has to be restored
+RESTORABLE_OPTIONS = (
+    "unique",
+    "sparse",
+    "expireAfterSeconds",
+    "partialFilterExpression",
+)
+
+# collection -> [(keys, options)]
+INDEXES = {
+    "validatorsList": [
+        # Validator details are upserted by wallet
+        ([("wallet_address", 1)], {"unique": True}),
+        # Validators eligible for emission
+        ([("score", 1)], {}),
+    ],
+    "poolList": [
+        ([("pool_address", 1)], {"unique": True}),
+    ],
+    "minerPool": [
+        ([("pool_address", 1)], {"unique": True}),
+        # Pools eligible for emission
+        ([("score", 1)], {}),
+    ],
+    "rewardLog": [
+        ([("block_height", 1)], {"unique": True}),
+    ],
+    "blockTransactions": [
+        # Backstop for the transaction dedup cache, which inserts hashes it
+        # has never seen without checking
+        ([("hash", 1)], {"unique": True}),
+        # Rewards recorded but not settled yet
+        ([("settled", 1)], {"partialFilterExpression": {"settled": False}}),
+    ],
+    "tempWithdrawals": [
+        ([("id", 1)], {}),
+        ([("timestamp", 1)], {}),
+    ],
+    # Transaction logs are upserted by wallet
+    "submittedTransactions": [
+        ([("wallet_address", 1)], {"unique": True}),
+    ],
+    "errorTransactions": [
+        ([("wallet_address", 1)], {"unique": True}),
+    ],
+    "catchTransactions": [
+        ([("wallet_address", 1)], {"unique": True}),
+    ],
+}
+
+# Indexes the service cannot run without. The transaction dedup cache
+# inserts hashes it has never seen without checking and relies on the unique
+# hash index to reject the ones it missed. Other failures are only logged.
+REQUIRED_INDEXES = [("blockTransactions", [("hash", 1)])]
+
+# (collection, filter, sort) for the queries the iNode runs most, explained by
+# --explain with placeholder values
+HOT_QUERIES = [
+    ("validatorsList", {"wallet_address": ""}, None),
+    ("validatorsList", {"score": 1}, None),
+    ("poolList", {"pool_address": ""}, None),
+    ("minerPool", {"pool_address": ""}, None),
+    ("minerPool", {"score": {"$gt": 0}}, None),
+    ("rewardLog", {"block_height": 0}, None),
+    ("blockTransactions", {"hash": ""}, None),
+    ("blockTransactions", {"settled": False}, None),
+    ("tempWithdrawals", {}, [("timestamp", 1)]),
+]
+
+
+def _key_list(keys):
+    return [(field, int(direction)) for field, direction in keys]
+
+
+def _find_existing(collection, keys):
+    for name, info in collection.index_information().items():
+        if _key_list(info["key"]) == _key_list(keys):
+            return name, info
+    return None, None
+
+
+def apply_index(collection, keys, options):
+    try:
+        collection.create_index(keys, **options)
+        return True, "ok"
+    except OperationFailure as e:
+        if e.code not in INDEX_CONFLICT_CODES:
+            return False, str(e)
+
+    # Same keys, other options: replace the index
+    name, info = _find_existing(collection, keys)
+    if name is None:
+        return False, "conflicting index not found"
+    collection.drop_index(name)
+    try:
+        collection.create_index(keys, **options)
+        return True, f"replaced {name}"
+    except OperationFailure as e:
+        # Typically duplicates blocking a new unique index
+        previous = {
+            option: info[option] for option in RESTORABLE_OPTIONS if option in info
+        }
+        collection.create_index(keys, name=name, **previous)
+        return False, f"kept {name}: {e}"
+
+
+def ensure_indexes():
+    # Returns (collection, keys) -> (success, message) for every index
+    results = {}
+    for collection_name, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                success, message = apply_index(db[collection_name], keys, options)
+            except Exception as e:
+                success, message = False, str(e)
+            results[(collection_name, tuple(keys))] = (success, message)
+            if not success:
+                logging.error(f"Index {collection_name} {keys} failed: {message}")
+            elif message != "ok":
+                logging.info(f"Index {collection_name} {keys}: {message}")
+    failed = sum(1 for success, _ in results.values() if not success)
+    logging.info(f"Indexes applied: {len(results) - failed}, failed: {failed}")
+    return results
+
+
+def required_indexes_applied(results):
+    applied = True
+    for collection_name, keys in REQUIRED_INDEXES:
+        success, _ = results.get((collection_name, tuple(keys)), (False, None))
+        if not success:
+            logging.error(f"Required index {collection_name} {keys} is missing")
+            applied = False
+    return applied
+
+
+def _plan_stages(plan):
+    # Flattens the winning plan into its stage names, e.g. FETCH <- IXSCAN
+    stages = []
+    while plan:
+        stage = plan.get("stage", "")
+        if plan.get("indexName"):
+            stage = f"{stage}({plan['indexName']})"
+        stages.append(stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " <- ".join(stages)
+
+
+def explain_query(collection_name, query, sort=None):
+    command = {"find": collection_name, "filter": query}
+    if sort:
+        command["sort"] = dict(sort)
+    result = db.command("explain", command, verbosity="executionStats")
+    planner = result["queryPlanner"]
+    stats = result["executionStats"]
+    winning_plan = planner["winningPlan"]
+    # Plans from the slot based engine nest the classic plan one level down
+    winning_plan = winning_plan.get("queryPlan", winning_plan)
+    return {
+        "plan": _plan_stages(winning_plan),
+        "keys_examined": stats["totalKeysExamined"],
+        "docs_examined": stats["totalDocsExamined"],
+        "millis": stats["executionTimeMillis"],
+    }
+
+
+def explain_hot_queries():
+    for collection_name, query, sort in HOT_QUERIES:
+        try:
+            explained = explain_query(collection_name, query, sort)
+        except OperationFailure as e:
+            print(f"{collection_name} {query}: {e}")
+            continue
+        slow = " COLLSCAN" if "COLLSCAN" in explained["plan"] else ""
+        print(
+            f"{collection_name} {query} sort={sort}:{slow}\n"
+            f"    {explained['plan']}\n"
+            f"    keys examined {explained['keys_examined']}, "
+            f"docs examined {explained['docs_examined']}, "
+            f"{explained['millis']} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="iNode index registry")
+    parser.add_argument(
+        "--explain", action="store_true", help="explain the hot queries"
+    )
+    args = parser.parse_args()
+    if args.explain:
+        explain_hot_queries()
+    else:
+        results = ensure_indexes()
+        if not all(success for success, _ in results.values()):
+            sys.exit(1)
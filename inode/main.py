@@ -11,6 +11,7 @@ import json
 from api.fastapi import app
 from api.api_client import test_api_connection
 from database.mongodb import test_db_connection
+from database.indexes import ensure_indexes, required_indexes_applied
 from utils.layout import base
 from protocol.protocol import iNode_protocol
 from transaction.batch import process_all_transactions
@@ -34,7 +35,8 @@ def run_fastapi():
 async def periodic_process_transactions():
     try:
         while True:
-            process_block_rewards()
+            # Block ingest makes blocking API and database calls
+            await asyncio.to_thread(process_block_rewards)
             await asyncio.sleep(base["TIME"]["CHECK_INTERVAL"])
     except Exception as e:
         print(f"Error in periodic_process_transactions: {e}")
@@ -107,6 +109,9 @@ if __name__ == "__main__":
     if not test_db_connection():
         logging.error("Failed to establish MongoDB connection. Exiting...")
         sys.exit(1)
+    if not required_indexes_applied(ensure_indexes()):
+        logging.error("Failed to apply the required MongoDB indexes. Exiting...")
+        sys.exit(3)
     if not test_api_connection(base["URLS"]["API_URL"]):
         logging.error("Failed to establish API connection. Exiting...")
         sys.exit(2)
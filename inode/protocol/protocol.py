@@ -4,6 +4,7 @@ from datetime import datetime, timedelta, date
 import logging
 import base58
 from utils.layout import base
+from database import async_mongodb as adb
 from reward_logic.reward import find_pool, get_validator_percentage, update_scores
 from reward_logic.find_validators import update_validator_info
 
@@ -57,55 +58,45 @@ async def iNode_protocol(websocket):
                 val_ip = parsed_message.get("ip")
                 val_port = parsed_message.get("port")
 
+                # Validators keep their connection open between messages, so
+                # only malformed messages close it
                 if pool_wallet is not None:
-                    pool_found, message = find_pool(pool_wallet)
+                    pool_found, message = await adb.run(find_pool, pool_wallet)
                     if not pool_found:
                         await websocket.send(f"ERROR: {message}")
-                        await websocket.close()
-                        active_connections.discard(websocket)
                         continue
 
                 if validator_wallet is not None:
-                    validator_found, message = get_validator_percentage(
-                        validator_wallet
+                    validator_found, message = await adb.run(
+                        get_validator_percentage, validator_wallet
                     )
                     if not validator_found:
                         await websocket.send(f"ERROR: {message}")
-                        await websocket.close()
-                        active_connections.discard(websocket)
                         continue
                     if validator_found < 1:
                         await websocket.send(f"ERROR: you don't have 1% stake")
-                        await websocket.close()
-                        active_connections.discard(websocket)
                         continue
 
                 if message_type == "TASK":
 
-                    set_score, message = update_scores(pool_wallet, validator_wallet)
+                    set_score, message = await adb.run(
+                        update_scores, pool_wallet, validator_wallet
+                    )
                     if set_score:
                         await websocket.send(f"SUCCESS: {val_id}")
-                        await websocket.close()
-                        active_connections.discard(websocket)
                         logging.info(f"SUCCESS: {set_score}|{message}")
                     else:
                         await websocket.send(f"ERROR: {message}")
-                        await websocket.close()
-                        active_connections.discard(websocket)
                         logging.info(f"ERROR: {message}")
 
                 elif message_type == "PING":
-                    update, message = update_validator_info(
-                        validator_wallet, val_ip, val_port
+                    update, message = await adb.run(
+                        update_validator_info, validator_wallet, val_ip, val_port
                     )
                     if update:
                         await websocket.send("SUCCESS: Pong")
-                        await websocket.close()
-                        active_connections.discard(websocket)
                     else:
                         await websocket.send(f"ERROR: {message}")
-                        await websocket.close()
-                        active_connections.discard(websocket)
                 else:
                     await websocket.send("ERROR: Unknown message type")
                     await websocket.close()
@@ -0,0 +1,122 @@
+import hashlib
+import logging
+from collections import OrderedDict
+
+from pymongo.errors import PyMongoError
+
+from database.mongodb import blockTransactions
+from utils.layout import base
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s:%(levelname)s - %(message)s"
+)
+
+CACHE_SIZE = base["REWARD_TRACKING"]["DEDUP_CACHE_SIZE"]
+BLOOM_BITS = base["REWARD_TRACKING"]["BLOOM_BITS"]
+BLOOM_HASHES = base["REWARD_TRACKING"]["BLOOM_HASHES"]
+
+# Bloom filter over recorded hashes: a miss means the hash was never recorded
+# since the filter was built, a hit only that it may have been
+_bloom = bytearray(BLOOM_BITS // 8)
+_bloom_count = 0
+# The CACHE_SIZE most recently recorded hashes, oldest first
+recent_hashes = OrderedDict()
+_seeded = False
+
+# known: dropped without a DB call, new: recorded for the first time,
+# checked: possible duplicates sent to MongoDB, false_positives: checked
+# hashes that turned out to be new
+dedup_counters = {"known": 0, "new": 0, "checked": 0, "false_positives": 0}
+
+
+def _bit_positions(hash_value):
+    digest = hashlib.blake2b(hash_value.encode(), digest_size=16).digest()
+    first = int.from_bytes(digest[:8], "little")
+    second = int.from_bytes(digest[8:], "little") | 1
+    return [(first + i * second) % BLOOM_BITS for i in range(BLOOM_HASHES)]
+
+
+def _bloom_add(hash_value):
+    global _bloom_count
+    for position in _bit_positions(hash_value):
+        _bloom[position >> 3] |= 1 << (position & 7)
+    _bloom_count += 1
+
+
+def _bloom_may_contain(hash_value):
+    return all(
+        _bloom[position >> 3] & (1 << (position & 7))
+        for position in _bit_positions(hash_value)
+    )
+
+
+def _rebuild_bloom():
+    # A bloom filter cannot forget, so once it has taken twice the exact set's
+    # worth of hashes it is rebuilt from the exact set to keep false
+    # positives down
+    global _bloom, _bloom_count
+    _bloom = bytearray(BLOOM_BITS // 8)
+    _bloom_count = 0
+    for hash_value in recent_hashes:
+        _bloom_add(hash_value)
+
+
+def remember(hash_values):
+    for hash_value in hash_values:
+        if hash_value in recent_hashes:
+            recent_hashes.move_to_end(hash_value)
+            continue
+        recent_hashes[hash_value] = None
+        _bloom_add(hash_value)
+        if len(recent_hashes) > CACHE_SIZE:
+            recent_hashes.popitem(last=False)
+    if _bloom_count > CACHE_SIZE * 2:
+        _rebuild_bloom()
+
+
+def seed_dedup_cache():
+    global _seeded
+    _seeded = True
+    try:
+        recent = blockTransactions.find({}, {"hash": 1, "_id": 0}).sort("_id", -1)
+        hash_values = [document["hash"] for document in recent.limit(CACHE_SIZE)]
+    except PyMongoError as e:
+        logging.error(f"An error occurred in seed_dedup_cache: {e}")
+        return False
+    # Oldest first so the newest hashes are the last to be evicted
+    remember(reversed(hash_values))
+    logging.info(f"Dedup cache seeded with {len(hash_values)} transaction hashes.")
+    return True
+
+
+def classify(hash_values):
+    # Splits hashes into (known, unseen, maybe): known are recorded for sure,
+    # unseen were never recorded, maybe need a database check
+    if not _seeded:
+        seed_dedup_cache()
+    known, unseen, maybe = [], [], []
+    for hash_value in hash_values:
+        if hash_value in recent_hashes:
+            known.append(hash_value)
+        elif _bloom_may_contain(hash_value):
+            maybe.append(hash_value)
+        else:
+            unseen.append(hash_value)
+    dedup_counters["known"] += len(known)
+    dedup_counters["checked"] += len(maybe)
+    return known, unseen, maybe
+
+
+def count_recorded(maybe, recorded):
+    dedup_counters["new"] += len(recorded)
+    dedup_counters["false_positives"] += sum(
+        1 for hash_value in maybe if hash_value in recorded
+    )
+
+
+def dedup_stats():
+    return {
+        **dedup_counters,
+        "cached": len(recent_hashes),
+        "bloom_entries": _bloom_count,
+    }
@@ -1,14 +1,16 @@
 import os
 import logging
 import json
-import asyncio
+import time
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s:%(levelname)s - %(message)s"
 )
 
 
-async def compute_task(task_id, task_description, task_seed):
+def compute_task(task_id, task_description, task_seed):
+    # Runs in a worker thread or process of the compute engine, so blocking
+    # work here does not stall the miner's event loop
     try:
         task_description
         task_seed
@@ -18,7 +20,7 @@ async def compute_task(task_id, task_description, task_seed):
             "output": "sample_output",
         }
         print("Simulating computing")
-        await asyncio.sleep(20)
+        time.sleep(20)
         print("After computing")
         output = json.dumps(result)
 
@@ -0,0 +1,53 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from compute.computation import compute_task
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s:%(levelname)s - %(message)s"
+)
+
+WORKER_MODES = ("async", "process")
+
+# compute_task runs off the event loop in either mode. "async" uses a thread
+# pool, suited to I/O-bound tasks; "process" uses a process pool, one per core.
+_mode = "async"
+_slots = None
+_executor = None
+
+
+def start_engine(workers, mode):
+    global _mode, _slots, _executor
+    if mode not in WORKER_MODES:
+        raise ValueError(f"Unknown worker mode: {mode}")
+    _mode = mode
+    _slots = asyncio.Semaphore(workers)
+    if mode == "process":
+        _executor = ProcessPoolExecutor(max_workers=workers)
+    else:
+        _executor = ThreadPoolExecutor(max_workers=workers)
+    logging.info(f"Compute engine started with {workers} {mode} workers")
+
+
+def stop_engine():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_compute(task_id, task_description, task_seed):
+    if _slots is None:
+        start_engine(1, "async")
+    # Tasks beyond the worker count wait here, already fetched, so the next
+    # one starts as soon as a worker frees up
+    async with _slots:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                _executor, compute_task, task_id, task_description, task_seed
+            )
+        except Exception as e:
+            logging.error(f"Error processing task in {_mode} worker: {e}")
+            return False, None
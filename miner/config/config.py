@@ -3,3 +3,6 @@ MINER_POOL_IP = None
 MINER_POOL_PORT = None
 INTERVAL = 5
 WALLET_ADDRESS = None
+CREDITS = 0
+WORKERS = 1
+WORKER_MODE = "async"
@@ -9,7 +9,8 @@ import base58
 
 from task.task_request import request_task
 from task.send_task import send_task
-from compute.computation import compute_task
+from task.session import run_session
+from compute.engine import WORKER_MODES, run_compute, start_engine, stop_engine
 from clear.clear_task import clear_directory
 
 logging.basicConfig(
@@ -28,6 +29,24 @@ def parse_args():
     parser.add_argument(
         "--WALLET_ADDRESS", required=True, help="Wallet address for the miner"
     )
+    parser.add_argument(
+        "--CREDITS",
+        type=int,
+        default=0,
+        help="Keep one session open with the pool and hold up to this many tasks in flight (0 connects once per task)",
+    )
+    parser.add_argument(
+        "--WORKERS",
+        type=int,
+        default=1,
+        help="Number of tasks computed concurrently",
+    )
+    parser.add_argument(
+        "--WORKER_MODE",
+        choices=WORKER_MODES,
+        default="async",
+        help="async for I/O-bound tasks, process for CPU-bound tasks",
+    )
     return parser.parse_args()
 
 
@@ -99,7 +118,7 @@ async def start_miner():
                     task_id = response_data.get("id")
                     task_description = response_data.get("task")
                     task_seed = response_data.get("seed")
-                    success, output = await compute_task(
+                    success, output = await run_compute(
                         task_id, task_description, task_seed
                     )
                     response_data = json.loads(output)
@@ -144,7 +163,12 @@ async def start_server():
     try:
         while True:
             try:
-                await start_miner()
+                if config.CREDITS > 0:
+                    uri = f"ws://{config.MINER_POOL_IP}:{config.MINER_POOL_PORT}"
+                    logging.info(f"Opening session with miner pool at {uri}")
+                    await run_session(uri, config.CREDITS)
+                else:
+                    await start_miner()
             except Exception as e:
                 logging.error("Miner closed due to an error: %s", e, exc_info=True)
                 break
@@ -152,26 +176,43 @@ async def start_server():
     except KeyboardInterrupt:
         logging.info("Miner shutdown initiated by user.")
     finally:
+        stop_engine()
         logging.info("Shutting down Miner...")
 
 
-try:
-    ensure_directory_exists("./no/")
-    clear_directory("./no/")
-    args = parse_args()
+async def run_miner():
+    start_engine(config.WORKERS, config.WORKER_MODE)
+    await start_server()
 
-    if not is_valid_address(args.WALLET_ADDRESS):
-        logging.error(
-            "Invalid wallet address provided. Please provide a valid address."
-        )
-        raise ValueError(
-            "Invalid wallet address provided. Please provide a valid address."
-        )
-    else:
-        # Override config values with command-line arguments
-        config.MINER_POOL_IP = args.MINER_POOL_IP
-        config.MINER_POOL_PORT = args.MINER_POOL_PORT
-        config.WALLET_ADDRESS = args.WALLET_ADDRESS
-        asyncio.get_event_loop().run_until_complete(start_server())
-except KeyboardInterrupt:
-    logging.info("Miner shutdown process complete.")
+
+# Worker processes re-import this module on platforms that spawn them
+if __name__ == "__main__":
+    try:
+        ensure_directory_exists("./no/")
+        clear_directory("./no/")
+        args = parse_args()
+
+        if not is_valid_address(args.WALLET_ADDRESS):
+            logging.error(
+                "Invalid wallet address provided. Please provide a valid address."
+            )
+            raise ValueError(
+                "Invalid wallet address provided. Please provide a valid address."
+            )
+        elif args.WORKERS < 1:
+            raise ValueError("--WORKERS must be at least 1.")
+        else:
+            # Override config values with command-line arguments
+            config.MINER_POOL_IP = args.MINER_POOL_IP
+            config.MINER_POOL_PORT = args.MINER_POOL_PORT
+            config.WALLET_ADDRESS = args.WALLET_ADDRESS
+            config.WORKERS = args.WORKERS
+            config.WORKER_MODE = args.WORKER_MODE
+            # Several workers need several tasks in flight, which only a
+            # session can provide
+            config.CREDITS = args.CREDITS or (
+                args.WORKERS if args.WORKERS > 1 else 0
+            )
+            asyncio.run(run_miner())
+    except KeyboardInterrupt:
+        logging.info("Miner shutdown process complete.")
@@ -0,0 +1,89 @@
+import json
+import asyncio
+import config.config as config
+import logging
+import websockets
+
+from compute.engine import run_compute
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s:%(levelname)s - %(message)s"
+)
+
+
+async def submit_output(websocket, output):
+    response_data = json.loads(output)
+    message = {
+        "type": "response",
+        "id": response_data.get("id"),
+        "output": response_data.get("output"),
+        "wallet_address": config.WALLET_ADDRESS,
+    }
+    await websocket.send(json.dumps(message))
+
+
+async def process_task(websocket, task):
+    success, output = await run_compute(
+        task.get("id"), task.get("task"), task.get("seed")
+    )
+    if success:
+        logging.info("Sending completed task to pool")
+        await submit_output(websocket, output)
+    else:
+        logging.error("Error: Failed to compute task")
+        # Hands the credit back so the pool pushes another task
+        message = {
+            "type": "release",
+            "id": task.get("id"),
+            "wallet_address": config.WALLET_ADDRESS,
+        }
+        await websocket.send(json.dumps(message))
+
+
+async def run_session(uri, credits):
+    # One socket for the whole session: the pool pushes a task whenever one of
+    # our `credits` slots is free and we answer each task on the same socket.
+    running = set()
+    try:
+        async with websockets.connect(uri) as websocket:
+            message = {
+                "type": "session",
+                "wallet_address": config.WALLET_ADDRESS,
+                "credits": credits,
+            }
+            await websocket.send(json.dumps(message))
+
+            async for message in websocket:
+                if message.startswith("ERROR"):
+                    logging.error("Pool response: %s", message)
+                    break
+
+                data = json.loads(message)
+                if data.get("type") == "session":
+                    logging.info("Session opened with %s credits", data.get("credits"))
+                elif data.get("type") == "ack":
+                    logging.info(
+                        "Pool response for Task %s submitted: %s",
+                        data.get("id"),
+                        data.get("message"),
+                    )
+                elif data.get("message_type") == "requestedTask":
+                    task = asyncio.create_task(process_task(websocket, data))
+                    running.add(task)
+                    task.add_done_callback(running.discard)
+                else:
+                    logging.error("Error: Unexpected message from pool: %s", data)
+    except websockets.ConnectionClosedError:
+        logging.error(
+            "ConnectionClosedError: The websocket connection is closed unexpectedly."
+        )
+    except websockets.WebSocketException as e:
+        logging.error(
+            "WebSocketException: An error occurred with the websocket connection. Details: %s",
+            e,
+        )
+    except json.JSONDecodeError:
+        logging.error("Error: Could not decode JSON response.")
+    finally:
+        for task in running:
+            task.cancel()
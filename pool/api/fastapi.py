@@ -7,17 +7,17 @@ from datetime import datetime
 import hashlib
 from pydantic import BaseModel
 
-from database.mongodb import (
-    miners,
-    challenges,
-)
+from database import async_mongodb as adb
+from database import miner_registry as registry
 from database.db_requests import (
-    check_active_users,
     get_balance_from_wallet,
     get_balance_poolowner,
     deduct_balance_from_wallet,
     deduct_balance_from_poolowner,
+    invalidate_miner_admission,
 )
+from task.activity import active_miner_counts
+from task.score_aggregator import pending_score_stats
 from utils.layout import base
 
 app = FastAPI()
@@ -72,58 +72,30 @@ def generate_target(difficulty):
     return "0" * difficulty + "f" * (64 - difficulty)
 
 
-async def register_miner(wallet_address, difficulty, hash, index):
+async def register_miner(wallet_address, difficulty, hash, index, challenge_data):
     try:
-        # Check if the miner is already registered
-        existing_miner = miners.find_one({"wallet_address": wallet_address})
-        if existing_miner:
-            print("Miner with this wallet address is already registered.")
-            return False, "Miner with this wallet address is already registered."
-
-        # Check total number of miners
-        miner_count = miners.count_documents({})
-        if miner_count >= base["WHITE_LIST"]["MAX_MINERS"]:
-            print("MAX MINERS REACHED")
-
-            # Find the oldest miner
-            oldest_miner_cursor = (
-                miners.find().sort([("difficulty", 1), ("time_registered", 1)]).limit(1)
-            )
-            oldest_miner = list(oldest_miner_cursor)
-
-            # Calculate time difference to check against immunity period
-            time_diff = datetime.utcnow() - oldest_miner[0]["time_registered"]
-            print("oldest_miner", oldest_miner)
-            print(
-                f'DIFFERENCE: {time_diff} : {datetime.utcnow()} - {oldest_miner[0]["time_registered"]}'
-            )
-            print(f' IMMUNITY: {base["WHITE_LIST"]["IMMUNITY"]}')
-
-            if time_diff.total_seconds() > base["WHITE_LIST"]["IMMUNITY"]:
-                print("removing someone")
-                old_wallet_address = oldest_miner[0]["wallet_address"]
-                print(f"{old_wallet_address} replaced by new {wallet_address}")
-                miners.delete_one({"_id": oldest_miner[0]["_id"]})
-            else:
-                print("No miner spot available due to immunity period.")
-                return False, "No miner spot available due to immunity period."
-
-        # Register the new miner if a spot is available
         miner_data = {
             "wallet_address": wallet_address,
             "hash": hash,
             "time_registered": datetime.utcnow(),
             "difficulty": difficulty,
-            "miner_id": (
-                miner_count + 1
-                if miner_count < base["WHITE_LIST"]["MAX_MINERS"]
-                else oldest_miner[0]["miner_id"]
-            ),
             "index": index,
         }
-        miners.insert_one(miner_data)
+        # Picks a free miner_id or, at MAX_MINERS, atomically evicts the lowest
+        # difficulty miner past its immunity period and takes its miner_id
+        registered, result = await adb.run(
+            registry.commit_registration, miner_data, challenge_data
+        )
+        if not registered:
+            print(result)
+            return False, result
+
+        if result["evicted"] is not None:
+            print(f"{result['evicted']} replaced by new {wallet_address}")
+            invalidate_miner_admission(result["evicted"])
+        invalidate_miner_admission(wallet_address)
         print("Miner registered successfully")
-        return True, None
+        return True, result
     except Exception as e:
         # Return error details if an exception occurs
         print(f"An error occurred during the registration process: {str(e)}")
@@ -134,8 +106,8 @@ async def register_miner(wallet_address, difficulty, hash, index):
 @limiter.limit(base["RATE_LIMIT"]["RATE_LIMIT1"])
 async def generate_challenge(request: Request):
     try:
-        miner_count = miners.count_documents({})
-        challenge_count = challenges.count_documents({})
+        # Served from the registry, no database round trips
+        miner_count, challenge_count, last_result_hash = registry.challenge_state()
         print("miner_count", miner_count)
         print("challenge_count", challenge_count)
 
@@ -169,11 +141,10 @@ async def generate_challenge(request: Request):
             )
             print("adjusted difficulty", difficulty)
 
-            last_challenge = challenges.find_one(sort=[("_id", -1)])
-            if last_challenge is None:
+            if last_result_hash is None:
                 previous_hash = "0" * 64
             else:
-                previous_hash = last_challenge["result_hash"]
+                previous_hash = last_result_hash
 
             target = generate_target(difficulty)
             challenge = {
@@ -219,19 +190,11 @@ async def submit_result(
                 status_code=400, detail="Result does not meet the challenge target"
             )
 
-        registered_miner = miners.find_one({"wallet_address": wallet_address})
-        if registered_miner:
-            raise HTTPException(
-                status_code=400,
-                detail="Miner with this wallet address is already registered and cannot submit new results",
-            )
-
-        existing_document = challenges.find_one({"index": index})
-        if existing_document:
-            raise HTTPException(
-                status_code=400,
-                detail="A valid result for this challenge has already been submitted",
-            )
+        # Duplicate wallets and already solved challenges are rejected from
+        # the in-memory registry, the database is only touched to commit
+        reserved, reserve_message = registry.reserve_submission(wallet_address, index)
+        if not reserved:
+            raise HTTPException(status_code=400, detail=reserve_message)
 
         data = {
             "index": index,
@@ -244,24 +207,22 @@ async def submit_result(
             "target": target,
         }
 
-        registration_success, registration_message = await register_miner(
-            wallet_address, difficulty, result_hash, index
-        )
+        try:
+            registration_success, registration_result = await register_miner(
+                wallet_address, difficulty, result_hash, index, data
+            )
+        finally:
+            registry.release_submission(wallet_address, index)
         if not registration_success:
-            raise HTTPException(status_code=409, detail=registration_message)
+            raise HTTPException(status_code=409, detail=registration_result)
 
-        result = challenges.insert_one(data)
-        if result.inserted_id:
-            return {
-                "message": "Result accepted",
-                "challenge_id": str(result.inserted_id),
-            }
-        else:
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to insert the challenge result",
-            )
+        return {
+            "message": "Result accepted",
+            "challenge_id": str(registration_result["challenge_id"]),
+        }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -270,11 +231,19 @@ async def submit_result(
 @limiter.limit(base["RATE_LIMIT"]["RATE_LIMIT1"])
 def get_active_users(request: Request):
     try:
-        return {"active_miners": check_active_users()}
+        counts = active_miner_counts()
+        # active_miners keeps its 15 minute meaning for existing clients
+        return {"active_miners": counts["15m"], "windows": counts}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/pending-scores")
+@limiter.limit(base["RATE_LIMIT"]["RATE_LIMIT1"])
+def get_pending_scores(request: Request):
+    return {"pending_scores": pending_score_stats()}
+
+
 @app.get("/get_balance/")
 @limiter.limit(base["RATE_LIMIT"]["RATE_LIMIT1"])
 async def get_balance(request: Request, wallet_address: str):
@@ -0,0 +1,86 @@
+# Compare concurrent-miner throughput of blocking pymongo calls made directly
+# from coroutines against the executor-backed async layer.
+#
+# Run from the pool directory against a disposable MongoDB:
+#   python3 -m benchmarks.concurrent_miners --miners 200 --requests 20
+import argparse
+import asyncio
+import time
+
+from database import async_mongodb as adb
+from database.async_mongodb import AsyncCollection
+from database.mongodb import db
+
+collection = db.benchmarkMiners
+async_collection = AsyncCollection(collection)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Concurrent miner DB benchmark")
+    parser.add_argument("--miners", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20)
+    return parser.parse_args()
+
+
+def seed(miners):
+    collection.drop()
+    collection.insert_many(
+        [{"wallet_address": f"wallet{i}", "score": 0} for i in range(miners)]
+    )
+    collection.create_index([("wallet_address", 1)], unique=True)
+
+
+async def blocking_miner(wallet_address, requests):
+    for _ in range(requests):
+        collection.find_one({"wallet_address": wallet_address})
+        collection.update_one({"wallet_address": wallet_address}, {"$inc": {"score": 1}})
+        await asyncio.sleep(0)
+
+
+async def async_miner(wallet_address, requests):
+    for _ in range(requests):
+        await async_collection.find_one({"wallet_address": wallet_address})
+        await async_collection.update_one(
+            {"wallet_address": wallet_address}, {"$inc": {"score": 1}}
+        )
+
+
+async def heartbeat(stop, lags):
+    # Measures how long the loop is stalled; a free loop wakes up every 10ms
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(0.01)
+        lags.append(loop.time() - started - 0.01)
+
+
+async def run_mode(miner, miners, requests):
+    stop = asyncio.Event()
+    lags = []
+    monitor = asyncio.create_task(heartbeat(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(miner(f"wallet{i}", requests) for i in range(miners)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+    operations = miners * requests
+    return operations / elapsed, max(lags, default=0.0)
+
+
+async def main():
+    args = parse_args()
+    seed(args.miners)
+    try:
+        for name, miner in (("blocking", blocking_miner), ("async", async_miner)):
+            throughput, max_lag = await run_mode(miner, args.miners, args.requests)
+            print(
+                f"{name:>8}: {throughput:10.1f} requests/s, "
+                f"max event loop stall {max_lag * 1000:8.1f} ms"
+            )
+    finally:
+        collection.drop()
+        adb.executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
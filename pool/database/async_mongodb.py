@@ -0,0 +1,53 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from database import mongodb
+from utils.layout import base
+
+# pymongo is blocking, so every call made from the event loop is handed to this
+# pool. The pool is loop-agnostic and can be shared with the FastAPI thread.
+executor = ThreadPoolExecutor(
+    max_workers=base["MONGOD_DB"]["ASYNC_WORKERS"], thread_name_prefix="mongodb"
+)
+
+
+async def run(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+
+class AsyncCollection:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        async def call(*args, **kwargs):
+            return await run(method, *args, **kwargs)
+
+        return call
+
+    async def find_list(self, *args, **kwargs):
+        # Cursors iterate lazily, so materialise them inside the executor
+        return await run(lambda: list(self.collection.find(*args, **kwargs)))
+
+
+miners = AsyncCollection(mongodb.miners)
+challenges = AsyncCollection(mongodb.challenges)
+userStats = AsyncCollection(mongodb.userStats)
+tempWithdrawals = AsyncCollection(mongodb.tempWithdrawals)
+submittedTransactions = AsyncCollection(mongodb.submittedTransactions)
+verifiedTransactions = AsyncCollection(mongodb.verifiedTransactions)
+rewardLog = AsyncCollection(mongodb.rewardLog)
+rewardSettlements = AsyncCollection(mongodb.rewardSettlements)
+entityOwners = AsyncCollection(mongodb.entityOwners)
+blockHeight = AsyncCollection(mongodb.blockHeight)
+blockTransactions = AsyncCollection(mongodb.blockTransactions)
+errorTransactions = AsyncCollection(mongodb.errorTransactions)
+catchTransactions = AsyncCollection(mongodb.catchTransactions)
+AiTask = AsyncCollection(mongodb.AiTask)
+ResponseTask = AsyncCollection(mongodb.ResponseTask)
+ValidationTask = AsyncCollection(mongodb.ValidationTask)
+ValidationTaskHistory = AsyncCollection(mongodb.ValidationTaskHistory)
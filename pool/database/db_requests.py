@@ -1,30 +1,25 @@
-from datetime import datetime, timedelta
+from datetime import datetime
+from collections import OrderedDict
+import threading
+import time
+import logging
 from database.mongodb import userStats, entityOwners, miners
 from reward_logic.percentage import round_up_decimal_new
 from transaction.payment import add_transaction_to_batch
+from utils.layout import base
 
 from decimal import Decimal, InvalidOperation
 
+# Miners above this many negative points are banned from mining
+MAX_NEGATIVE_POINTS = 45
 
-def check_active_users(batch_size=1000):
-    current_time = datetime.utcnow()
-    active_user_count = 0
+ADMISSION_CACHE_TTL = base["ELIGIBILITY_CACHE"]["TTL"]
+ADMISSION_CACHE_SIZE = base["ELIGIBILITY_CACHE"]["MAX_SIZE"]
 
-    try:
-
-        cursor = userStats.find({}, {"last_active_time": 1}).batch_size(batch_size)
-
-        for user in cursor:
-            last_active_time = user["last_active_time"]
-            if (current_time - last_active_time) < timedelta(minutes=15):
-                active_user_count += 1
-
-        return active_user_count
-    except Exception as e:
-        raise e
-    finally:
-
-        cursor.close()
+# wallet -> (expires_at, admission). Shared by the miner socket and the API
+# thread, hence the lock.
+_admission_cache = OrderedDict()
+_admission_lock = threading.Lock()
 
 
 def get_balance_from_wallet(wallet_address):
@@ -184,12 +179,54 @@ def deduct_balance_from_poolowner(amount_to_deduct):
         )
 
 
-def white_list(wallet_address):
+def get_cached_admission(wallet_address):
+    with _admission_lock:
+        entry = _admission_cache.get(wallet_address)
+        if entry is None:
+            return None
+        expires_at, admission = entry
+        if expires_at <= time.monotonic():
+            del _admission_cache[wallet_address]
+            return None
+        _admission_cache.move_to_end(wallet_address)
+        return admission
+
+
+def load_miner_admission(wallet_address):
     try:
-        registered_miner = miners.find_one({"wallet_address": wallet_address})
-        if registered_miner:
-            return True
-        else:
-            return False
+        registered_miner = miners.find_one(
+            {"wallet_address": wallet_address}, {"_id": 1}
+        )
+        user_stat = userStats.find_one({"wallet_address": wallet_address}, {"np": 1})
     except Exception as e:
-        return False, f"Error: {str(e)}"
+        logging.error(f"An error occurred in load_miner_admission: {e}")
+        return None
+
+    np = user_stat.get("np", 0) if user_stat else 0
+    admission = {
+        "registered": registered_miner is not None,
+        "np": np,
+        "banned": np > MAX_NEGATIVE_POINTS,
+    }
+    with _admission_lock:
+        _admission_cache[wallet_address] = (
+            time.monotonic() + ADMISSION_CACHE_TTL,
+            admission,
+        )
+        _admission_cache.move_to_end(wallet_address)
+        while len(_admission_cache) > ADMISSION_CACHE_SIZE:
+            _admission_cache.popitem(last=False)
+    return admission
+
+
+def get_miner_admission(wallet_address):
+    admission = get_cached_admission(wallet_address)
+    if admission is None:
+        admission = load_miner_admission(wallet_address)
+    return admission
+
+
+def invalidate_miner_admission(*wallet_addresses):
+    with _admission_lock:
+        for wallet_address in wallet_addresses:
+            _admission_cache.pop(wallet_address, None)
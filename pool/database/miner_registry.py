@@ -0,0 +1,221 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+
+from database.mongodb import db, miners, challenges
+from utils.layout import base
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s:%(levelname)s - %(message)s"
+)
+
+MAX_MINERS = base["WHITE_LIST"]["MAX_MINERS"]
+IMMUNITY = base["WHITE_LIST"]["IMMUNITY"]
+# Lowest difficulty first, then longest registered; backed by a compound index
+EVICTION_ORDER = [("difficulty", 1), ("time_registered", 1)]
+
+# MongoDB's IllegalOperation code, returned by standalone servers that cannot
+# run transactions
+TRANSACTIONS_UNSUPPORTED = 20
+
+# Wallets in the miners collection mapped to their miner_id slot, the highest solved challenge index, the
+# number of solved challenges and the hash of the latest one. The API builds
+# and verifies challenges from these without touching the database.
+registered_wallets = {}
+latest_challenge_index = 0
+challenge_count = 0
+last_result_hash = None
+# Bumped on every registration so a reconcile that read the database before
+# a registration landed does not overwrite it
+_version = 0
+# Submissions that passed verification and are being committed, so a second
+# submission for the same wallet or challenge is rejected meanwhile
+_reserved_wallets = set()
+_reserved_indexes = set()
+# miner_id slots picked by registrations that are being committed
+_reserved_slots = set()
+
+_lock = threading.Lock()
+
+
+class RegistrationConflict(Exception):
+    pass
+
+
+def load_registry():
+    global latest_challenge_index, challenge_count, last_result_hash
+    with _lock:
+        version = _version
+    try:
+        wallets = {
+            miner["wallet_address"]: miner.get("miner_id")
+            for miner in miners.find({}, {"wallet_address": 1, "miner_id": 1, "_id": 0})
+        }
+        count = challenges.count_documents({})
+        last_challenge = challenges.find_one(
+            {}, {"index": 1, "result_hash": 1}, sort=[("index", -1)]
+        )
+    except PyMongoError as e:
+        logging.error(f"An error occurred in load_registry: {e}")
+        return False
+
+    with _lock:
+        if version != _version:
+            logging.info("Miner registry changed during reload, keeping it.")
+            return False
+        registered_wallets.clear()
+        registered_wallets.update(wallets)
+        challenge_count = count
+        latest_challenge_index = last_challenge["index"] if last_challenge else 0
+        last_result_hash = last_challenge["result_hash"] if last_challenge else None
+    logging.info(
+        f"Miner registry loaded: {len(wallets)} miners, {count} challenges, latest challenge {latest_challenge_index}."
+    )
+    return True
+
+
+def miner_count():
+    return len(registered_wallets)
+
+
+def challenge_state():
+    with _lock:
+        return len(registered_wallets), challenge_count, last_result_hash
+
+
+def reserve_submission(wallet_address, index):
+    with _lock:
+        if wallet_address in registered_wallets or wallet_address in _reserved_wallets:
+            return (
+                False,
+                "Miner with this wallet address is already registered and cannot submit new results",
+            )
+        if index <= latest_challenge_index or index in _reserved_indexes:
+            return False, "A valid result for this challenge has already been submitted"
+        _reserved_wallets.add(wallet_address)
+        _reserved_indexes.add(index)
+        return True, None
+
+
+def release_submission(wallet_address, index):
+    with _lock:
+        _reserved_wallets.discard(wallet_address)
+        _reserved_indexes.discard(index)
+
+
+def _reserve_slot():
+    # Lowest miner_id not held by a registered miner or an in-flight
+    # registration, None when every slot is taken
+    with _lock:
+        used = set(registered_wallets.values()) | _reserved_slots
+        for miner_id in range(1, MAX_MINERS + 1):
+            if miner_id not in used:
+                _reserved_slots.add(miner_id)
+                return miner_id
+    return None
+
+
+def _release_slot(miner_id):
+    with _lock:
+        _reserved_slots.discard(miner_id)
+
+
+def _undo_registration(miner_data, miner_id, evicted_miner, miner_inserted):
+    # Without a transaction the writes that did land are reverted by hand
+    try:
+        if miner_inserted:
+            miners.delete_one(
+                {"wallet_address": miner_data["wallet_address"], "miner_id": miner_id}
+            )
+        if evicted_miner is not None:
+            miners.insert_one(evicted_miner)
+    except PyMongoError as e:
+        logging.error(f"An error occurred in _undo_registration: {e}")
+
+
+def _write_registration(session, miner_data, challenge_data, miner_id):
+    evicted_miner = None
+    miner_inserted = False
+    try:
+        if miner_id is None:
+            # Picks and removes the victim in one indexed step, so two
+            # concurrent registrations can never evict the same miner
+            evicted_miner = miners.find_one_and_delete(
+                {
+                    "time_registered": {
+                        "$lte": datetime.utcnow() - timedelta(seconds=IMMUNITY)
+                    }
+                },
+                sort=EVICTION_ORDER,
+                session=session,
+            )
+            if evicted_miner is None:
+                raise RegistrationConflict(
+                    "No miner spot available due to immunity period."
+                )
+            miner_id = evicted_miner["miner_id"]
+
+        # The unique miner_id index caps the collection at MAX_MINERS slots
+        miners.insert_one({**miner_data, "miner_id": miner_id}, session=session)
+        miner_inserted = True
+
+        # Inserted last so a registration that fails on a standalone server
+        # never leaves its challenge behind, which would block the index
+        challenge_id = challenges.insert_one(
+            challenge_data, session=session
+        ).inserted_id
+    except Exception:
+        if session is None:
+            _undo_registration(miner_data, miner_id, evicted_miner, miner_inserted)
+        raise
+    return challenge_id, evicted_miner, miner_id
+
+
+def commit_registration(miner_data, challenge_data):
+    global latest_challenge_index, challenge_count, last_result_hash, _version
+    slot = _reserve_slot()
+    try:
+        with db.client.start_session() as session:
+            try:
+                # Challenge, eviction and registration land together or not at all
+                challenge_id, evicted_miner, miner_id = session.with_transaction(
+                    lambda s: _write_registration(
+                        s, miner_data, challenge_data, slot
+                    )
+                )
+            except OperationFailure as e:
+                if e.code != TRANSACTIONS_UNSUPPORTED:
+                    raise
+                # Standalone server, the unique indexes still reject duplicates
+                challenge_id, evicted_miner, miner_id = _write_registration(
+                    None, miner_data, challenge_data, slot
+                )
+    except RegistrationConflict as e:
+        return False, str(e)
+    except DuplicateKeyError as e:
+        # Another worker registered first, the in-memory state is stale
+        load_registry()
+        if "miner_id" in str(e):
+            return False, "No miner spot available, please retry."
+        return False, "A valid result for this challenge has already been submitted"
+    except PyMongoError as e:
+        logging.error(f"An error occurred in commit_registration: {e}")
+        return False, f"An error occurred during the registration process: {str(e)}"
+    else:
+        evicted_wallet = None
+        with _lock:
+            if evicted_miner is not None:
+                evicted_wallet = evicted_miner["wallet_address"]
+                registered_wallets.pop(evicted_wallet, None)
+            registered_wallets[miner_data["wallet_address"]] = miner_id
+            challenge_count += 1
+            if challenge_data["index"] > latest_challenge_index:
+                latest_challenge_index = challenge_data["index"]
+                last_result_hash = challenge_data["result_hash"]
+            _version += 1
+        return True, {"challenge_id": challenge_id, "evicted": evicted_wallet}
+    finally:
+        # Released only once the slot shows up in registered_wallets
+        _release_slot(slot)
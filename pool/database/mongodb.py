@@ -39,6 +39,7 @@ tempWithdrawals = db.tempWithdrawals
 submittedTransactions = db.submittedTransactions
 verifiedTransactions = db.verifiedTransactions
 rewardLog = db.rewardLog
+rewardSettlements = db.rewardSettlements
 entityOwners = db.entityOwners
 blockHeight = db.blockHeight
 blockTransactions = db.blockTransactions
@@ -51,10 +52,3 @@ AiTask = db.AiTask
 ResponseTask = db.ResponseTask
 ValidationTask = db.ValidationTask
 ValidationTaskHistory = db.ValidationTaskHistory
-
-
-try:
-    ResponseTask.create_index([("expireAt", 1)], expireAfterSeconds=0)
-    print("TTL index created successfully on ResponseTask collection.")
-except Exception as e:
-    print(f"An error occurred while creating TTL index: {e}")
@@ -1,8 +1,19 @@
 import requests
 import hashlib
+import itertools
+import multiprocessing
+import time
 
 API_URL = "http://0.0.0.0:8003"
 
+# Nonces handed to a worker at a time
+CHUNK_SIZE = 100_000
+
+# Set in each worker by _init_worker
+_midstate = None
+_suffix = None
+_target = None
+
 
 def get_challenge():
     response = requests.get(f"{API_URL}/generate_challenge/")
@@ -10,18 +21,58 @@ def get_challenge():
     return response.json()
 
 
-def mine(challenge, wallet_address):
+def _init_worker(prefix, suffix, target):
+    global _midstate, _suffix, _target
+    # Everything before the nonce is the same for every attempt, hash it once
+    _midstate = hashlib.sha256(prefix)
+    _suffix = suffix
+    _target = target
+
+
+def search_range(start):
+    for nonce in range(start, start + CHUNK_SIZE):
+        candidate = _midstate.copy()
+        candidate.update(b"%d%b" % (nonce, _suffix))
+        digest = candidate.digest()
+        # Raw digests compare in the same order as their hex strings
+        if digest < _target:
+            return nonce, digest.hex()
+    return None
+
+
+def mine(challenge, wallet_address, processes=None):
     difficulty = challenge["difficulty"]
     print("difficulty_mine", difficulty)
     index = challenge["index"]
     target = "0" * difficulty + "f" * (64 - difficulty)
-    nonce = 0
-    while True:
-        text = f"{challenge['time']}:{challenge['previous_hash']}:{wallet_address}:{nonce}:{index}"
-        hash_result = hashlib.sha256(text.encode()).hexdigest()
-        if hash_result < target:
-            return nonce, hash_result
-        nonce += 1
+    prefix = f"{challenge['time']}:{challenge['previous_hash']}:{wallet_address}:"
+    suffix = f":{index}"
+    processes = processes or multiprocessing.cpu_count()
+
+    started = time.perf_counter()
+    hashes = 0
+    starts = itertools.count(0, CHUNK_SIZE)
+    with multiprocessing.Pool(
+        processes,
+        initializer=_init_worker,
+        initargs=(prefix.encode(), suffix.encode(), bytes.fromhex(target)),
+    ) as pool:
+        while True:
+            # A bounded round of chunks keeps every core busy without queueing
+            # an endless nonce range
+            round_starts = list(itertools.islice(starts, processes * 4))
+            for result in pool.imap_unordered(search_range, round_starts):
+                hashes += CHUNK_SIZE
+                if result:
+                    pool.terminate()
+                    elapsed = time.perf_counter() - started
+                    print(
+                        f"Solved with {processes} processes: about {hashes} hashes "
+                        f"in {elapsed:.2f}s ({hashes / elapsed:,.0f} H/s)"
+                    )
+                    return result
+            elapsed = time.perf_counter() - started
+            print(f"{hashes} hashes, {hashes / elapsed:,.0f} H/s")
 
 
 def submit_result(challenge, nonce, result_hash, wallet_address):
@@ -42,10 +93,11 @@ def submit_result(challenge, nonce, result_hash, wallet_address):
 
 
 # Example usage
-challenge = get_challenge()
-wallet_address = "wallet201"
-print("challenge", challenge)
-nonce, result_hash = mine(challenge, wallet_address)
-print("mining compeleted")
-result = submit_result(challenge, nonce, result_hash, wallet_address)
-print(result)
+if __name__ == "__main__":
+    challenge = get_challenge()
+    wallet_address = "wallet201"
+    print("challenge", challenge)
+    nonce, result_hash = mine(challenge, wallet_address)
+    print("mining compeleted")
+    result = submit_result(challenge, nonce, result_hash, wallet_address)
+    print(result)
@@ -8,12 +8,23 @@ import time
 
 from api.fastapi import app
 from api.api_client import test_api_connection
+from database import async_mongodb as adb
 from database.mongodb import test_db_connection
+from database.indexes import ensure_indexes, required_indexes_applied
+from database.miner_registry import load_registry
 from utils.layout import base
 from reward_logic.process_blocks import process_block_rewards
 from protocol.protocol import miner_protocol
 from transaction.batch import process_all_transactions
-from task.task import generate_validation_task
+from task.task import (
+    generate_validation_task,
+    migrate_task_history_expiry,
+    migrate_task_priority,
+)
+from task.dispatcher import run_task_dispatcher
+from task.ingest import run_response_ingest
+from task.score_aggregator import run_score_aggregator
+from task.activity import load_activity
 
 
 logging.basicConfig(
@@ -32,7 +43,8 @@ def run_fastapi():
 async def periodic_process_transactions():
     try:
         while True:
-            process_block_rewards()
+            # Block ingest makes blocking API and database calls
+            await asyncio.to_thread(process_block_rewards)
             await asyncio.sleep(base["TIME"]["CHECK_INTERVAL"])
     except Exception as e:
         print(f"Error in periodic_process_transactions: {e}")
@@ -47,6 +59,16 @@ async def periodic_gen_validation_task():
         print(f"Error in periodic_gen_validation_task: {e}")
 
 
+async def periodic_reconcile_registry():
+    # Picks up registrations and evictions made outside this API process
+    while True:
+        await asyncio.sleep(base["TIME"]["RECONCILE_REGISTRY"])
+        try:
+            await adb.run(load_registry)
+        except Exception as e:
+            print(f"Error in periodic_reconcile_registry: {e}")
+
+
 def update_balance_periodically():
     try:
         while True:
@@ -70,18 +92,38 @@ async def main():
 
     periodic_task = asyncio.create_task(periodic_process_transactions())
     periodic_validation_task = asyncio.create_task(periodic_gen_validation_task())
+    dispatcher_task = asyncio.create_task(run_task_dispatcher())
+    ingest_task = asyncio.create_task(run_response_ingest())
+    score_task = asyncio.create_task(run_score_aggregator())
+    registry_task = asyncio.create_task(periodic_reconcile_registry())
 
     try:
-        await asyncio.gather(periodic_task, periodic_validation_task)
+        await asyncio.gather(
+            periodic_task,
+            periodic_validation_task,
+            dispatcher_task,
+            ingest_task,
+            score_task,
+            registry_task,
+        )
     except KeyboardInterrupt:
         logging.info("Shutting down Pool due to KeyboardInterrupt.")
     finally:
         logging.info("Pool shutdown process starting.")
         periodic_task.cancel()
         periodic_validation_task.cancel()
+        # Stop ingest first so its final flush can still write assignments
+        ingest_task.cancel()
+        await asyncio.gather(ingest_task, return_exceptions=True)
+        dispatcher_task.cancel()
+        score_task.cancel()
+        registry_task.cancel()
         await asyncio.gather(
             periodic_task,
             periodic_validation_task,
+            dispatcher_task,
+            score_task,
+            registry_task,
             return_exceptions=True,
         )
         logging.info("Pool shutdown process complete.")
@@ -91,9 +133,16 @@ if __name__ == "__main__":
     if not test_db_connection():
         logging.error("Failed to establish MongoDB connection. Exiting...")
         sys.exit(1)
+    if not required_indexes_applied(ensure_indexes()):
+        logging.error("Failed to apply the required MongoDB indexes. Exiting...")
+        sys.exit(3)
     if not test_api_connection(base["URLS"]["API_URL"]):
         logging.error("Failed to establish API connection. Exiting...")
         sys.exit(2)
+    migrate_task_priority()
+    migrate_task_history_expiry()
+    load_registry()
+    load_activity()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import logging
+import random
+import time
+
+import websockets
+
+from utils.layout import base
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s:%(levelname)s - %(message)s"
+)
+
+PING_INTERVAL = base["WS_POOL"]["PING_INTERVAL"]
+REQUEST_TIMEOUT = base["WS_POOL"]["REQUEST_TIMEOUT"]
+RECONNECT_BASE = base["WS_POOL"]["RECONNECT_BASE"]
+RECONNECT_MAX = base["WS_POOL"]["RECONNECT_MAX"]
+
+# uri -> open PooledConnection, reused by every request to that peer
+connections = {}
+# uri -> (failed attempts, monotonic time before which no reconnect is tried)
+_backoff = {}
+_connect_locks = {}
+
+
+def reply_key(message):
+    # Replies carry the val_id either as a JSON field or as "SUCCESS: <val_id>"
+    try:
+        parsed_message = json.loads(message)
+        if isinstance(parsed_message, dict):
+            return parsed_message.get("val_id")
+    except json.JSONDecodeError:
+        pass
+    if message.startswith("SUCCESS: "):
+        return message[len("SUCCESS: ") :]
+    return None
+
+
+class PooledConnection:
+    def __init__(self, uri, websocket):
+        self.uri = uri
+        self.websocket = websocket
+        # (key, future) for every request awaiting a reply, in send order
+        self.pending = []
+        self.send_lock = asyncio.Lock()
+        self.reader = asyncio.create_task(self.read())
+
+    def is_open(self):
+        return not self.reader.done()
+
+    async def read(self):
+        try:
+            async for message in self.websocket:
+                self.resolve(message)
+        except websockets.ConnectionClosed:
+            pass
+        except Exception as e:
+            logging.error(f"Error reading from {self.uri}: {e}")
+        finally:
+            if connections.get(self.uri) is self:
+                del connections[self.uri]
+            for _, future in self.pending:
+                if not future.done():
+                    future.set_exception(
+                        ConnectionError(f"Connection to {self.uri} closed")
+                    )
+            self.pending.clear()
+
+    def resolve(self, message):
+        if not self.pending:
+            logging.info(f"Unsolicited message from {self.uri}: {message}")
+            return
+        key = reply_key(message)
+        # Match on val_id, replies without one (errors, pongs) go to the
+        # oldest request since peers answer in order
+        index = next(
+            (
+                i
+                for i, (pending_key, _) in enumerate(self.pending)
+                if key is not None and pending_key == key
+            ),
+            0,
+        )
+        _, future = self.pending.pop(index)
+        if not future.done():
+            future.set_result(message)
+
+    async def request(self, message, key, timeout):
+        future = asyncio.get_running_loop().create_future()
+        async with self.send_lock:
+            self.pending.append((key, future))
+            await self.websocket.send(message)
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            # A late reply could be matched to the wrong request, start over
+            await self.close()
+            raise
+
+    async def close(self):
+        await self.websocket.close()
+        await asyncio.gather(self.reader, return_exceptions=True)
+
+
+async def get_connection(uri):
+    connection = connections.get(uri)
+    if connection is not None and connection.is_open():
+        return connection
+
+    async with _connect_locks.setdefault(uri, asyncio.Lock()):
+        connection = connections.get(uri)
+        if connection is not None and connection.is_open():
+            return connection
+
+        failures, retry_at = _backoff.get(uri, (0, 0))
+        if time.monotonic() < retry_at:
+            raise ConnectionError(f"Waiting to reconnect to {uri}")
+        try:
+            websocket = await websockets.connect(
+                uri,
+                open_timeout=REQUEST_TIMEOUT,
+                ping_interval=PING_INTERVAL,
+                ping_timeout=PING_INTERVAL,
+            )
+        except Exception:
+            # Exponential backoff with jitter so peers coming back up are not
+            # hit by every client at once
+            delay = min(RECONNECT_MAX, RECONNECT_BASE * 2**failures)
+            _backoff[uri] = (
+                failures + 1,
+                time.monotonic() + delay * random.uniform(0.5, 1.5),
+            )
+            raise
+
+        _backoff.pop(uri, None)
+        connection = PooledConnection(uri, websocket)
+        connections[uri] = connection
+        logging.info(f"Opened pooled connection to {uri}")
+        return connection
+
+
+async def request(uri, message, key=None, timeout=REQUEST_TIMEOUT):
+    connection = await get_connection(uri)
+    return await connection.request(message, key, timeout)
+
+
+async def close_connections():
+    await asyncio.gather(
+        *(connection.close() for connection in list(connections.values())),
+        return_exceptions=True,
+    )
@@ -9,13 +9,15 @@ import os
 import logging
 import base58
 from task.task import (
-    handle_miner_response,
-    is_task_valid,
-    miner_eligibility,
-    task_validation_output,
-    find_task,
+    TASK_RECLAIM_AFTER,
+    get_cached_task_validity,
+    load_task_validity,
+    apply_validation_verdicts,
 )
-from database.db_requests import white_list
+from task.dispatcher import dispatch_task
+from task.ingest import handle_miner_response
+from database.db_requests import get_cached_admission, load_miner_admission
+from database import async_mongodb as adb
 from utils.layout import base
 
 logging.basicConfig(
@@ -26,6 +28,7 @@ active_connections = set()
 validator_connections = set()
 MAX_CONCURRENT_MINERS = base["MAX_CONCURRENT"]["MINERS"]
 MAX_CONCURRENT_VALIDATORS = base["MAX_CONCURRENT"]["VALIDATORS"]
+MAX_SESSION_CREDITS = base["MINER_SESSION"]["MAX_CREDITS"]
 
 
 def is_valid_address(address: str) -> bool:
@@ -49,6 +52,32 @@ def is_valid_address(address: str) -> bool:
         return False
 
 
+async def push_session_tasks(websocket, session):
+    # Tasks the miner never answered can be reclaimed in the DB by now, so
+    # their credits are freed rather than lost
+    current_time = datetime.utcnow()
+    for task_id, sent_at in list(session["in_flight"].items()):
+        if current_time - sent_at >= TASK_RECLAIM_AFTER:
+            session["in_flight"].pop(task_id, None)
+
+    # Keep the miner's credit window full
+    while len(session["in_flight"]) < session["credits"]:
+        task_id, task_details = await dispatch_task(
+            session["wallet_address"], reuse_outstanding=False
+        )
+        if not (task_id and task_details):
+            break
+        session["in_flight"][task_id] = current_time
+        await websocket.send(task_details)
+
+
+def session_credits(parsed_message):
+    credits = parsed_message.get("credits", 1)
+    if not isinstance(credits, int) or credits < 1:
+        return None
+    return min(credits, MAX_SESSION_CREDITS)
+
+
 async def miner_protocol(websocket):
     global active_connections
     num_active_connections = len(active_connections)
@@ -57,6 +86,8 @@ async def miner_protocol(websocket):
         await websocket.close(reason="ERROR: Max connection limit reached")
         return
     active_connections.add(websocket)
+    # Set once the miner opens a persistent session on this socket
+    session = None
     try:
         async for message in websocket:
             try:
@@ -73,22 +104,96 @@ async def miner_protocol(websocket):
                     active_connections.discard(websocket)
                     continue
 
-                if base["WHITE_LIST"]["ACTIVE"] == "True":
-                    if wallet_address is not None and not white_list(wallet_address):
+                if wallet_address is not None:
+                    # Served from memory for all but the first message of a
+                    # wallet in each cache period
+                    admission = get_cached_admission(wallet_address)
+                    if admission is None:
+                        admission = await adb.run(load_miner_admission, wallet_address)
+
+                    if admission is None:
+                        await websocket.send("ERROR: Unable to verify miner")
+                        await websocket.close()
+                        active_connections.discard(websocket)
+                        continue
+
+                    if (
+                        base["WHITE_LIST"]["ACTIVE"] == "True"
+                        and not admission["registered"]
+                    ):
                         await websocket.send("ERROR: You are not a registered miner")
                         await websocket.close()
                         active_connections.discard(websocket)
                         continue
 
-                if wallet_address is not None and not miner_eligibility(wallet_address):
+                    if admission["banned"]:
+                        await websocket.send(
+                            "ERROR: You are banned from mining, too high negative score"
+                        )
+                        await websocket.close()
+                        active_connections.discard(websocket)
+                        continue
+
+                if message_type == "session":
+                    credits = session_credits(parsed_message)
+                    if wallet_address is None or credits is None:
+                        await websocket.send("ERROR: Invalid session request")
+                        await websocket.close()
+                        active_connections.discard(websocket)
+                        continue
+                    session = {
+                        "wallet_address": wallet_address,
+                        "credits": credits,
+                        # task id -> time it was pushed
+                        "in_flight": {},
+                    }
                     await websocket.send(
-                        "ERROR: You are banned from mining, too high negative score"
+                        json.dumps({"type": "session", "credits": credits})
                     )
-                    await websocket.close()
-                    active_connections.discard(websocket)
-                    continue
+                    await push_session_tasks(websocket, session)
 
-                if message_type == "response":
+                elif message_type == "credit" and session is not None:
+                    credits = session_credits(parsed_message)
+                    if credits is None:
+                        await websocket.send("ERROR: Invalid credit update")
+                        continue
+                    session["credits"] = credits
+                    await push_session_tasks(websocket, session)
+
+                elif message_type == "response" and session is not None:
+                    if wallet_address != session["wallet_address"]:
+                        await websocket.send("ERROR: Wallet does not match session")
+                        await websocket.close()
+                        active_connections.discard(websocket)
+                        continue
+                    success, message = await handle_miner_response(
+                        id, wallet_address, output
+                    )
+                    await websocket.send(
+                        json.dumps(
+                            {
+                                "type": "ack",
+                                "id": id,
+                                "success": success,
+                                "message": message,
+                            }
+                        )
+                    )
+                    session["in_flight"].pop(id, None)
+                    await push_session_tasks(websocket, session)
+
+                elif message_type == "release" and session is not None:
+                    # The miner could not compute the task; the credit is
+                    # freed and the task is reclaimed once its miner times out
+                    if wallet_address != session["wallet_address"]:
+                        await websocket.send("ERROR: Wallet does not match session")
+                        await websocket.close()
+                        active_connections.discard(websocket)
+                        continue
+                    session["in_flight"].pop(id, None)
+                    await push_session_tasks(websocket, session)
+
+                elif message_type == "response":
                     success, message = await handle_miner_response(
                         id, wallet_address, output
                     )
@@ -102,7 +207,7 @@ async def miner_protocol(websocket):
                         active_connections.discard(websocket)
 
                 elif message_type == "request":
-                    task_id, task_details = await find_task(wallet_address)
+                    task_id, task_details = await dispatch_task(wallet_address)
                     if task_id and task_details:
                         # print(f"Found task: {task_id} - {task_details}")
                         task_details = json.dumps(task_details)
@@ -161,39 +266,28 @@ async def validation_protocol(websocket):
                     validator_connections.discard(websocket)
                     continue
 
-                if val_id is not None and not is_task_valid(val_id):
-                    await websocket.send("ERROR: task is invalid or expired")
-                    await websocket.close()
-                    validator_connections.discard(websocket)
-                    continue
+                # Validators keep their connection open between responses, so
+                # only malformed messages close it
+                if val_id is not None:
+                    valid = get_cached_task_validity(val_id)
+                    if valid is None:
+                        valid = await adb.run(load_task_validity, val_id)
+                    if not valid:
+                        await websocket.send("ERROR: task is invalid or expired")
+                        continue
 
                 if message_type == "response":
-                    all_success = True
-                    for entry in result:
-                        wallet_address = entry.get("wallet_address")
-                        tp = entry.get("tp")
-                        np = entry.get("np")
-
-                        if tp is not None:
-                            success, message = task_validation_output(
-                                wallet_address, tp=tp
-                            )
-                        elif np is not None:
-                            success, message = task_validation_output(
-                                wallet_address, np=np
-                            )
-                        else:
-                            success, message = False, "Missing tp or np"
-
-                        if not success:
-                            all_success = False
-                            await websocket.send(f"ERROR: {message}")
-                            break
-
-                    if all_success:
-                        await websocket.send(f"SUCCESS: {val_id}")
-                        await websocket.close()
-                        validator_connections.discard(websocket)
+                    # All verdicts are applied in one bulk write; unknown miners
+                    # are reported per wallet rather than failing the response
+                    success, results = await adb.run(apply_validation_verdicts, result)
+                    if not success:
+                        await websocket.send(f"ERROR: {results}")
+                        continue
+
+                    for wallet_address, (applied, message) in results.items():
+                        if not applied:
+                            logging.info(f"Verdict for {wallet_address}: {message}")
+                    await websocket.send(f"SUCCESS: {val_id}")
 
                 else:
                     await websocket.send("ERROR: Unknown message type")
@@ -1,15 +1,22 @@
+import heapq
 import logging
 import json
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import ReturnDocument, UpdateOne
 from reward_logic.reward_log import store_in_db, retrieve_from_db
-from reward_logic.percentage import round_up_decimal_new
-from database.mongodb import userStats
-from decimal import Decimal
+from database.mongodb import userStats, rewardSettlements
+from utils.layout import base
+from decimal import Decimal, ROUND_HALF_EVEN
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s:%(levelname)s - %(message)s"
 )
 
+BASE_UNITS = Decimal(10**8)
+SETTLEMENT_BATCH_SIZE = base["SETTLEMENT"]["BATCH_SIZE"]
+SETTLEMENT_WORKERS = base["SETTLEMENT"]["WORKERS"]
+
 
 def convert_decimal_to_float(data):
     if isinstance(data, dict):
@@ -22,55 +29,203 @@ def convert_decimal_to_float(data):
         return data
 
 
-def update_miner_balances(amount, block_range, batch_size=1000):
-    amount = Decimal(amount)
+def to_base_units(value):
+    # 1 coin = 10^8 base units, the precision of round_up_decimal_new
+    return int(
+        (Decimal(str(value)) * BASE_UNITS).to_integral_value(rounding=ROUND_HALF_EVEN)
+    )
+
+
+def from_base_units(units):
+    return float(Decimal(units) / BASE_UNITS)
+
+
+def distribute_shares(amount_units, scores):
+    # Exact largest-remainder split of amount_units over (wallet, score_units)
+    # pairs: every miner gets the floor of its share, the units left over go
+    # to the largest remainders, ties broken by wallet address
+    total_score = sum(score for _, score in scores)
+    shares = {}
+    remainders = []
+    distributed = 0
+    for wallet_address, score in scores:
+        share, remainder = divmod(amount_units * score, total_score)
+        shares[wallet_address] = share
+        remainders.append((-remainder, wallet_address))
+        distributed += share
+
+    for _, wallet_address in heapq.nsmallest(amount_units - distributed, remainders):
+        shares[wallet_address] += 1
+    return shares
+
+
+def open_settlement(amount, block_range):
+    # The journal entry is created once per block range, re-runs get the
+    # existing entry back and pick up from its status
+    return rewardSettlements.find_one_and_update(
+        {"block_range": block_range},
+        {
+            "$setOnInsert": {
+                "block_range": block_range,
+                "amount": float(amount),
+                "status": "snapshot",
+                "created_at": datetime.utcnow(),
+            }
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def snapshot_scores(block_range):
+    # Moves each score into the settlement field in one document-level atomic
+    # step, so increments landing afterwards count towards the next range
+    userStats.update_many(
+        {"score": {"$gt": 0}, "settlement": {"$exists": False}},
+        [
+            {
+                "$set": {
+                    "settlement": {
+                        "block_range": block_range,
+                        "score": "$score",
+                        "balance": {"$ifNull": ["$balance", 0]},
+                    },
+                    "score": 0,
+                }
+            }
+        ],
+    )
+
+
+def assign_shares(settlement, batch_size):
+    block_range = settlement["block_range"]
+    snapshot = list(
+        userStats.find(
+            {"settlement.block_range": block_range},
+            {"wallet_address": 1, "settlement": 1},
+        )
+    )
+    if not snapshot:
+        return {}
+
+    scores = [
+        (miner_data["wallet_address"], to_base_units(miner_data["settlement"]["score"]))
+        for miner_data in snapshot
+    ]
+    # Nothing has been paid in this phase, so a re-run sees the same snapshot
+    # and computes the same shares
+    shares = distribute_shares(to_base_units(settlement["amount"]), scores)
+
+    operations = []
     miner_updates = {}
+    for miner_data in snapshot:
+        wallet_address = miner_data["wallet_address"]
+        share = shares[wallet_address]
+        previous_balance = to_base_units(miner_data["settlement"]["balance"])
+        operations.append(
+            UpdateOne(
+                {"_id": miner_data["_id"], "settlement.block_range": block_range},
+                {"$set": {"settlement.share": share}},
+            )
+        )
+        miner_updates[wallet_address] = {
+            "previous_balance": from_base_units(previous_balance),
+            "score": miner_data["settlement"]["score"],
+            "added_amount": from_base_units(share),
+            "current_balance": from_base_units(previous_balance + share),
+        }
 
-    try:
-        total_score = Decimal(0)
-        cursor = userStats.find({"score": {"$gt": 0}})
-        filtered_miners = []
-
-        # Calculate total score
-        for miner_data in cursor:
-            score = Decimal(miner_data.get("score", 0))
-            filtered_miners.append(miner_data)
-            total_score += score
-
-        if total_score == 0:
-            logging.info("No miners have a positive score; no balances updated.")
-            return
+    for i in range(0, len(operations), batch_size):
+        userStats.bulk_write(operations[i : i + batch_size], ordered=False)
+    return miner_updates
 
-        # Process miners in batches
-        for i in range(0, len(filtered_miners), batch_size):
-            batch = filtered_miners[i : i + batch_size]
-            for miner_data in batch:
-                previous_balance = Decimal(miner_data.get("balance", 0))
-                score = Decimal(miner_data.get("score", 0))
-                miner_share = (score / total_score) * amount
-                miner_share = round_up_decimal_new(miner_share)
-                current_balance = round_up_decimal_new(previous_balance + miner_share)
-
-                # Update the miner's document in MongoDB (convert Decimal to float)
-                result = userStats.update_one(
-                    {"wallet_address": miner_data["wallet_address"]},
-                    {"$set": {"balance": float(current_balance), "score": 0}},
-                )
-
-                miner_updates[miner_data["wallet_address"]] = {
-                    "previous_balance": float(previous_balance),
-                    "score": float(score),
-                    "added_amount": float(miner_share),
-                    "current_balance": float(current_balance),
+
+def balance_credit(share):
+    # Balances stay float coins elsewhere in the pool. Shares are exact base
+    # units up to here; the new balance is rounded back to 8 decimals on the
+    # server, like deduct_balance_from_wallet, so float error never builds up
+    return [
+        {
+            "$set": {
+                "balance": {
+                    "$round": [
+                        {"$add": [{"$ifNull": ["$balance", 0]}, from_base_units(share)]},
+                        8,
+                    ]
                 }
+            }
+        },
+        {"$unset": "settlement"},
+    ]
+
+
+def pay_chunk(block_range, chunk):
+    # Matching on the settlement marker makes a repeated payment a no-op
+    operations = [
+        UpdateOne(
+            {"_id": miner_data["_id"], "settlement.block_range": block_range},
+            balance_credit(miner_data["settlement"]["share"]),
+        )
+        for miner_data in chunk
+    ]
+    return userStats.bulk_write(operations, ordered=False).modified_count
+
+
+def pay_shares(block_range, batch_size):
+    pending = list(
+        userStats.find(
+            {
+                "settlement.block_range": block_range,
+                "settlement.share": {"$exists": True},
+            },
+            {"settlement.share": 1},
+        )
+    )
+    chunks = [pending[i : i + batch_size] for i in range(0, len(pending), batch_size)]
+    with ThreadPoolExecutor(max_workers=SETTLEMENT_WORKERS) as executor:
+        return sum(executor.map(lambda chunk: pay_chunk(block_range, chunk), chunks))
 
-        # Convert all Decimal values to float before storing
-        miner_updates = convert_decimal_to_float(miner_updates)
 
-        # Store updates in the DB (external function)
-        store_in_db(block_range, miner_updates)
+def update_miner_balances(amount, block_range, batch_size=SETTLEMENT_BATCH_SIZE):
+    try:
+        settlement = open_settlement(amount, block_range)
+        if settlement["status"] == "settled":
+            logging.info(f"Block range {block_range} is already settled.")
+            return
 
-        logging.info("Balances updated and scores are reset.")
+        if settlement["status"] == "snapshot":
+            snapshot_scores(block_range)
+            miner_updates = assign_shares(settlement, batch_size)
+            if not miner_updates:
+                logging.info("No miners have a positive score; no balances updated.")
+            else:
+                # Store updates in the DB (external function)
+                store_in_db(block_range, miner_updates)
+            rewardSettlements.update_one(
+                {"block_range": block_range},
+                {"$set": {"status": "paying", "miners": len(miner_updates)}},
+            )
+
+        paid = pay_shares(block_range, batch_size)
+        rewardSettlements.update_one(
+            {"block_range": block_range},
+            {"$set": {"status": "settled", "settled_at": datetime.utcnow()}},
+        )
+        logging.info(f"Settled block range {block_range}: {paid} balances updated.")
 
     except Exception as e:
         logging.error(f"update_miner_balances An unexpected error occurred: {e}")
+
+
+def resume_settlements():
+    # Finishes ranges interrupted by a crash, oldest first, before new ones
+    try:
+        unfinished = list(
+            rewardSettlements.find({"status": {"$ne": "settled"}}).sort("created_at", 1)
+        )
+    except Exception as e:
+        logging.error(f"resume_settlements An unexpected error occurred: {e}")
+        return
+    for settlement in unfinished:
+        logging.info(f"Resuming settlement of block range {settlement['block_range']}")
+        update_miner_balances(settlement["amount"], settlement["block_range"])
@@ -3,7 +3,8 @@ import json
 from datetime import datetime
 from reward_logic.reward_log import store_in_db, retrieve_from_db
 from reward_logic.percentage import round_up_decimal_new
-from database.mongodb import entityOwners
+from database.mongodb import entityOwners, rewardSettlements
+from pymongo.errors import DuplicateKeyError
 from decimal import Decimal
 from utils.layout import base
 
@@ -23,9 +24,17 @@ def convert_decimal_to_float(data):
         return data
 
 
-def update_pool_reward(amount):
+def update_pool_reward(amount, block_range):
     amount = Decimal(amount)
     try:
+        # A block range re-run after a crash has already paid the owner
+        settlement = rewardSettlements.find_one(
+            {"block_range": block_range}, {"owner_paid": 1}
+        )
+        if settlement and settlement.get("owner_paid"):
+            logging.info(f"Pool reward for block range {block_range} already paid.")
+            return
+
         pool_owner_data = entityOwners.find_one({"_id": "entityOwners"})
 
         if pool_owner_data:
@@ -40,16 +49,26 @@ def update_pool_reward(amount):
         new_amount = round_up_decimal_new(current_amount + amount)
         current_time_utc = datetime.utcnow().isoformat()
 
-        entityOwners.update_one(
-            {"_id": "entityOwners"},
-            {
-                "$set": {
-                    "amount": float(new_amount),
-                    "last_processed": current_time_utc,
-                    "wallet_address": wallet_address,
-                }
-            },
-            upsert=True,
+        # The credited range is written with the amount, so a crash before
+        # owner_paid is set cannot credit the same range twice
+        try:
+            entityOwners.update_one(
+                {"_id": "entityOwners", "block_range": {"$ne": block_range}},
+                {
+                    "$set": {
+                        "amount": float(new_amount),
+                        "last_processed": current_time_utc,
+                        "wallet_address": wallet_address,
+                        "block_range": block_range,
+                    }
+                },
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            logging.info(f"Pool reward for block range {block_range} already paid.")
+
+        rewardSettlements.update_one(
+            {"block_range": block_range}, {"$set": {"owner_paid": True}}
         )
 
     except Exception as e:
@@ -1,10 +1,12 @@
 from database.mongodb import blockTransactions
 from utils.layout import base
-from pymongo.errors import PyMongoError
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
 from protocol.set_block import get_last_block_height, set_last_block_height
-from api.api_client import fetch_block
+from api.api_client import fetch_blocks
 from reward_logic.percentage import calculate_percentages, percentage_match
-from reward_logic.miner_reward import update_miner_balances
+from reward_logic.dedup_cache import classify, count_recorded, dedup_stats, remember
+from reward_logic.miner_reward import resume_settlements, update_miner_balances
 from reward_logic.pool_reward import update_pool_reward
 import logging
 
@@ -13,25 +15,169 @@ logging.basicConfig(
     level=logging.INFO, format="%(asctime)s:%(levelname)s - %(message)s"
 )
 
-
-def record_block_transactions(hash_value):
-    try:
-        result = blockTransactions.update_one(
+PAGE_SIZE = base["REWARD_TRACKING"]["PAGE_SIZE"]
+CONCURRENT_PAGES = base["REWARD_TRACKING"]["CONCURRENT_PAGES"]
+
+
+def record_block_transactions(transactions):
+    # Records a page of transactions (hash -> {"amount", "block"}) in one round
+    # trip. Each new hash is stored unsettled with its amount, so it journals
+    # the reward until process_block_rewards pays it out. Returns the hashes
+    # that were not recorded before, and whether every hash is now recorded.
+    known, unseen, maybe = classify(list(transactions))
+    if not unseen and not maybe:
+        return set(), True
+
+    # Hashes the cache has never seen are inserted outright, the unique index
+    # rejects any the cache missed. Possible duplicates are upserted.
+    candidates = unseen + maybe
+    operations = [
+        InsertOne({"hash": hash_value, **transactions[hash_value], "settled": False})
+        for hash_value in unseen
+    ] + [
+        UpdateOne(
             {"hash": hash_value},
-            {"$setOnInsert": {"hash": hash_value}},
+            {
+                "$setOnInsert": {
+                    "hash": hash_value,
+                    **transactions[hash_value],
+                    "settled": False,
+                }
+            },
             upsert=True,
         )
-        if result.upserted_id is not None:
-            # logging.info(f"Inserted new transaction with hash: {hash_value}")
-            return True
-        else:
-            logging.info(f"Transaction with hash: {hash_value} already exists.")
-            return False
+        for hash_value in maybe
+    ]
+    failed = {}
+    try:
+        result = blockTransactions.bulk_write(operations, ordered=False)
+        upserted = result.upserted_ids.keys()
+    except BulkWriteError as e:
+        failed = {error["index"]: error["code"] for error in e.details["writeErrors"]}
+        upserted = [upsert["index"] for upsert in e.details.get("upserted", [])]
     except PyMongoError as e:
         logging.error(
-            f"Failed to insert or check transaction with hash: {hash_value}. Error in record_block_transactions: {e}"
+            f"Failed to insert or check transactions. Error in record_block_transactions: {e}"
+        )
+        return set(), False
+
+    recorded = {
+        hash_value for index, hash_value in enumerate(unseen) if index not in failed
+    } | {candidates[index] for index in upserted}
+    # Duplicate keys mean the hash is already recorded
+    complete = all(code == 11000 for code in failed.values())
+    if not complete:
+        logging.error(
+            f"Failed to record some transactions. Error in record_block_transactions: {failed}"
+        )
+
+    remember(
+        hash_value
+        for index, hash_value in enumerate(candidates)
+        if failed.get(index, 11000) == 11000
+    )
+    count_recorded(maybe, recorded)
+    return recorded, complete
+
+
+def fetch_block_pages(start_height):
+    # Yields pages of blocks in chain order, CONCURRENT_PAGES fetched at a
+    # time, until a short or empty page shows the chain tip was reached
+    offset = start_height
+    while True:
+        api_urls = [
+            f"{base['URLS']['API_URL']}/get_blocks_details?offset={offset + i * PAGE_SIZE}&limit={PAGE_SIZE}"
+            for i in range(CONCURRENT_PAGES)
+        ]
+        for data in fetch_blocks(api_urls):
+            if data is None or not data["result"]:
+                return
+            yield data["result"]
+            if len(data["result"]) < PAGE_SIZE:
+                return
+        offset += PAGE_SIZE * CONCURRENT_PAGES
+
+
+def relevant_transactions(blocks, wallet_address):
+    # Yields (hash, {"amount", "block"}) for REGULAR transfers into
+    # wallet_address that are not self-transactions
+    for block in blocks:
+        for transaction in block["transactions"]:
+            if transaction.get("transaction_type", "REGULAR") != "REGULAR":
+                continue
+
+            input_addresses = {
+                input["address"] for input in transaction.get("inputs", [])
+            }
+            transaction_amount = sum(
+                output["amount"]
+                for output in transaction["outputs"]
+                if output["address"] == wallet_address
+                and output["type"] == "REGULAR"
+                and output["address"] not in input_addresses
+            )
+            if transaction_amount > 0:
+                yield transaction["hash"], {
+                    "amount": transaction_amount,
+                    "block": block["block"]["id"],
+                }
+
+
+def ingest_block_pages():
+    last_block_height = get_last_block_height()
+
+    if last_block_height is None:
+        logging.info("No last block height found in db, using hardcoded value.")
+        last_block_height = base["REWARD_TRACKING"]["BLOCK_HEIGHT"]
+    else:
+        last_block_height += 1
+
+    logging.info(f"Starting processing from block height: {last_block_height}")
+
+    # Catches up page by page until the chain tip. A page's rewards are
+    # journaled with its hashes before the height moves past it
+    pages = 0
+    for blocks in fetch_block_pages(last_block_height):
+        transactions = dict(
+            relevant_transactions(blocks, base["POOL_WALLETS"]["POOL_ADDRESS"])
         )
+        recorded, complete = record_block_transactions(transactions)
+
+        for hash_value in transactions:
+            if hash_value not in recorded:
+                logging.info(f"Skipping already processed transaction: {hash_value}")
+
+        if not complete:
+            # The height stays put so the page is fetched again next run
+            logging.error("Stopping block ingest, transactions could not be recorded.")
+            break
+        set_last_block_height(blocks[-1]["block"]["id"])
+        pages += 1
+
+    logging.info(f"Transaction dedup cache: {dedup_stats()}")
+    if pages == 0:
+        logging.error("No block data retrieved or no new blocks since last check.")
+    return pages
+
+
+def recorded_rewards():
+    # Sums the transactions recorded but not settled yet
+    transactions = list(
+        blockTransactions.find({"settled": False}, {"amount": 1, "block": 1})
+    )
+    if not transactions:
         return None
+    total_amount = sum(transaction["amount"] for transaction in transactions)
+    blocks = [transaction["block"] for transaction in transactions]
+    block_range_str = f"{min(blocks)}-{max(blocks)}"
+    transaction_ids = [transaction["_id"] for transaction in transactions]
+    return total_amount, block_range_str, transaction_ids
+
+
+def mark_rewards_settled(transaction_ids):
+    blockTransactions.update_many(
+        {"_id": {"$in": transaction_ids}}, {"$set": {"settled": True}}
+    )
 
 
 def analyze_block_rewards():
@@ -40,82 +186,26 @@ def analyze_block_rewards():
         logging.info(f"Some issue with Miner/Pool AWARD_SYSTEM")
         return None
     try:
-        last_block_height = get_last_block_height()
-
-        if last_block_height is None:
-            logging.info("No last block height found in db, using hardcoded value.")
-            last_block_height = base["REWARD_TRACKING"]["BLOCK_HEIGHT"]
-        else:
-            last_block_height += 1
-
-        logging.info(f"Starting processing from block height: {last_block_height}")
-
-        data = fetch_block(
-            f"{base['URLS']['API_URL']}/get_blocks_details?offset={last_block_height}&limit=10"
-        )
-
-        if data is None or not data["result"]:
-            logging.error("No block data retrieved or no new blocks since last check.")
-            return None
-
-        total_amount = 0
-        first_block_id = data["result"][0]["block"]["id"]
-        last_block_idX = data["result"][-1]["block"]["id"]
-        last_block_id = None
-
-        for block in data["result"]:
-            block_id = block["block"]["id"]
-            last_block_id = block_id
-
-            for transaction in block["transactions"]:
-                hash_value = transaction["hash"]
-                transaction_amount = 0  # Initialize transaction amount
-
-                if transaction.get("transaction_type", "REGULAR") != "REGULAR":
-                    continue
-
-                # Collect all input addresses for the current transaction
-                input_addresses = [
-                    input["address"] for input in transaction.get("inputs", [])
-                ]
-
-                # Check if the transaction is relevant and calculate its amount
-                for output in transaction["outputs"]:
-                    # Check if the output is for the miner pool wallet address, the type is REGULAR, and the output address is not in the transaction's input addresses (not a self-transaction)
-                    if (
-                        output["address"] == base["POOL_WALLETS"]["POOL_ADDRESS"]
-                        and output["type"] == "REGULAR"
-                        and output["address"] not in input_addresses
-                    ):
-                        transaction_amount += output["amount"]
-
-                # Only proceed if the transaction is relevant and not already recorded
-                if transaction_amount > 0:
-                    if record_block_transactions(hash_value):
-                        # Add the transaction amount only if it's a new transaction
-                        total_amount += transaction_amount
-                    else:
-                        logging.info(
-                            f"Skipping already processed transaction: {hash_value}"
-                        )
-
-        if last_block_id is not None:
-            set_last_block_height(last_block_id)
-        else:
-            logging.info("No new blocks to process.")
-
-        if total_amount <= 0:
+        # Rewards left unsettled by an interrupted run are settled on their
+        # own first, so their block range matches the one journaled then
+        pending = recorded_rewards()
+        if pending is None:
+            ingest_block_pages()
+            pending = recorded_rewards()
+
+        if pending is None:
             logging.info(
                 f'No relevant transactions found for {base["POOL_WALLETS"]["POOL_ADDRESS"]} in the latest blocks.'
             )
             return None
 
-        percentages = calculate_percentages(total_amount)
-        block_range_str = f"{first_block_id}-{last_block_idX}"
-
-        # print("percentages", percentages, "total_amount", total_amount)
+        total_amount, block_range_str, transaction_ids = pending
+        if total_amount <= 0:
+            mark_rewards_settled(transaction_ids)
+            return None
 
-        return percentages, block_range_str
+        percentages = calculate_percentages(total_amount)
+        return percentages, block_range_str, transaction_ids
 
     except Exception as e:
         logging.error(f"An error occurred during analyze_block_rewards: {e}")
@@ -124,11 +214,13 @@ def analyze_block_rewards():
 
 def process_block_rewards():
     try:
+        resume_settlements()
         info = analyze_block_rewards()
         if info is not None:
-            percentages, block_range_str = info
+            percentages, block_range_str, transaction_ids = info
             update_miner_balances(percentages["82%"], block_range_str)
-            update_pool_reward(percentages["18%"])
+            update_pool_reward(percentages["18%"], block_range_str)
+            mark_rewards_settled(transaction_ids)
             logging.info(f'All miners Reward: {percentages["82%"]} ')
             logging.info(f'Pool Reward: {percentages["18%"]} ')
         else:
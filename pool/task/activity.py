@@ -0,0 +1,76 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from pymongo.errors import PyMongoError
+
+from database.mongodb import userStats
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s:%(levelname)s - %(message)s"
+)
+
+# Reported windows in minutes, the largest is how long a wallet is tracked
+ACTIVITY_WINDOWS = (1, 5, 15)
+TRACKED_MINUTES = max(ACTIVITY_WINDOWS)
+
+# minute -> wallets whose latest activity falls in that minute, so each wallet
+# is counted in exactly one bucket
+activity_buckets = {}
+# wallet -> minute of its bucket
+last_active_minute = {}
+
+# Fed from the pool's event loop, read from the FastAPI thread
+_lock = threading.Lock()
+
+
+def _minute(moment):
+    return int(moment.timestamp() // 60)
+
+
+def _prune(current_minute):
+    oldest = current_minute - TRACKED_MINUTES
+    for minute in [minute for minute in activity_buckets if minute <= oldest]:
+        for wallet_address in activity_buckets.pop(minute):
+            last_active_minute.pop(wallet_address, None)
+
+
+def record_activity(wallet_address, seen_at):
+    minute = _minute(seen_at)
+    with _lock:
+        previous = last_active_minute.get(wallet_address)
+        if previous is not None and previous >= minute:
+            return
+        if previous is not None:
+            activity_buckets[previous].discard(wallet_address)
+        activity_buckets.setdefault(minute, set()).add(wallet_address)
+        last_active_minute[wallet_address] = minute
+
+
+def active_miner_counts():
+    current_minute = _minute(datetime.utcnow())
+    with _lock:
+        _prune(current_minute)
+        return {
+            f"{window}m": sum(
+                len(activity_buckets.get(current_minute - offset, ()))
+                for offset in range(window)
+            )
+            for window in ACTIVITY_WINDOWS
+        }
+
+
+def load_activity():
+    # Seeds the tracker after a restart from what userStats already records
+    cutoff = datetime.utcnow() - timedelta(minutes=TRACKED_MINUTES)
+    try:
+        for user in userStats.find(
+            {"last_active_time": {"$gte": cutoff}},
+            {"wallet_address": 1, "last_active_time": 1},
+        ):
+            record_activity(user["wallet_address"], user["last_active_time"])
+    except PyMongoError as e:
+        logging.error(f"An error occurred in load_activity: {e}")
+        return False
+    logging.info(f"Activity tracker loaded with {len(last_active_minute)} miners.")
+    return True
@@ -0,0 +1,228 @@
+import asyncio
+import itertools
+import logging
+from datetime import datetime, timedelta
+
+import uuid_utils as uuid
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from database.mongodb import AiTask
+from database import async_mongodb as adb
+from task.task import (
+    PRIORITY_MAP,
+    TASK_RECLAIM_AFTER,
+    claimable_filter,
+    find_task,
+    format_task,
+)
+from utils.layout import base
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s:%(levelname)s - %(message)s"
+)
+
+BATCH_SIZE = base["TASK_QUEUE"]["BATCH_SIZE"]
+LOW_WATER = base["TASK_QUEUE"]["LOW_WATER"]
+LEASE_TIME = timedelta(seconds=base["TASK_QUEUE"]["LEASE_TIME"])
+REFILL_INTERVAL = base["TASK_QUEUE"]["REFILL_INTERVAL"]
+FLUSH_INTERVAL = base["TASK_QUEUE"]["FLUSH_INTERVAL"]
+
+# (priority, time, seq, task) entries for tasks leased from AiTask in bulk
+task_queue = asyncio.PriorityQueue()
+# lease_id -> expiry of every lease whose tasks may still be in the queue
+active_leases = {}
+# task id -> UpdateOne assigning a dispatched task to its miner, not yet written
+pending_assignments = {}
+# wallet -> (task, assigned_at) for tasks handed out by this dispatcher
+wallet_tasks = {}
+# task id -> lease of a task handed out by this dispatcher, checked on response
+assigned_tasks = {}
+
+_sequence = itertools.count()
+_flush_lock = asyncio.Lock()
+
+
+def lease_tasks(limit):
+    current_time = datetime.utcnow()
+    lease_id = str(uuid.uuid7())
+    lease_expires = current_time + LEASE_TIME
+
+    candidates = (
+        AiTask.find(claimable_filter(current_time), {"id": 1})
+        .sort([("priority", 1), ("time", 1)])
+        .limit(limit)
+    )
+    ids = [task["id"] for task in candidates]
+    if not ids:
+        return None, None, []
+
+    # Re-check claimability in the update so tasks taken by another claimer
+    # between the read and the write are left alone
+    AiTask.update_many(
+        {"$and": [{"id": {"$in": ids}}, claimable_filter(current_time)]},
+        {
+            "$set": {
+                "status": "leased",
+                "lease_id": lease_id,
+                "lease_expires": lease_expires,
+            }
+        },
+    )
+    leased = list(AiTask.find({"lease_id": lease_id}))
+    return lease_id, lease_expires, leased
+
+
+async def refill_task_queue():
+    if task_queue.qsize() >= LOW_WATER:
+        return 0
+    try:
+        lease_id, lease_expires, leased = await adb.run(lease_tasks, BATCH_SIZE)
+    except PyMongoError as e:
+        logging.error(f"An error occurred in refill_task_queue: {e}")
+        return 0
+
+    if leased:
+        active_leases[lease_id] = lease_expires
+
+    for task in leased:
+        priority = task.get("priority", PRIORITY_MAP.get(task.get("type"), 3))
+        task_queue.put_nowait((priority, task["time"], next(_sequence), task))
+    return len(leased)
+
+
+def _is_lease_live(task, current_time):
+    lease_expires = active_leases.get(task.get("lease_id"))
+    # Leave a small margin so the assignment is written before the DB-side
+    # reclaim path could hand the task to someone else
+    return lease_expires is not None and current_time < lease_expires - timedelta(
+        seconds=FLUSH_INTERVAL * 2
+    )
+
+
+async def dispatch_task(wallet_address, reuse_outstanding=True):
+    current_time = datetime.utcnow()
+
+    outstanding = wallet_tasks.get(wallet_address) if reuse_outstanding else None
+    if outstanding:
+        task, assigned_at = outstanding
+        if current_time - assigned_at < TASK_RECLAIM_AFTER:
+            return format_task(task)
+        wallet_tasks.pop(wallet_address, None)
+
+    while not task_queue.empty():
+        _, _, _, task = task_queue.get_nowait()
+        if not _is_lease_live(task, current_time):
+            continue
+
+        pending_assignments[task["id"]] = UpdateOne(
+            {"id": task["id"], "lease_id": task["lease_id"]},
+            {
+                "$set": {
+                    "wallet": wallet_address,
+                    "time": current_time.isoformat(),
+                    "status": "sent",
+                },
+                "$unset": {"lease_id": "", "lease_expires": ""},
+            },
+        )
+        if reuse_outstanding:
+            wallet_tasks[wallet_address] = (task, current_time)
+        assigned_tasks[task["id"]] = {
+            "wallet": wallet_address,
+            "time": current_time.isoformat(),
+            "assigned_at": current_time,
+            "retrieve_id": task["retrieve_id"],
+            "type": task["type"],
+        }
+        return format_task(task)
+
+    # Queue ran dry between refills, fall back to claiming straight from the DB
+    return await find_task(wallet_address, reuse_outstanding)
+
+
+def take_assignment(task_id, wallet_address):
+    # Returns the cached lease once; later submissions for the same task fall
+    # through to the database check
+    lease = assigned_tasks.get(task_id)
+    if lease is None or lease["wallet"] != wallet_address:
+        return None
+    assigned_tasks.pop(task_id, None)
+    outstanding = wallet_tasks.get(wallet_address)
+    if outstanding and outstanding[0]["id"] == task_id:
+        wallet_tasks.pop(wallet_address, None)
+    if datetime.utcnow() - lease["assigned_at"] >= TASK_RECLAIM_AFTER:
+        return None
+    return lease
+
+
+async def flush_assignments():
+    async with _flush_lock:
+        if not pending_assignments:
+            return True
+        operations = list(pending_assignments.values())
+        task_ids = list(pending_assignments.keys())
+        try:
+            await adb.AiTask.bulk_write(operations, ordered=False)
+        except PyMongoError as e:
+            logging.error(f"An error occurred in flush_assignments: {e}")
+            return False
+        for task_id in task_ids:
+            pending_assignments.pop(task_id, None)
+        return True
+
+
+def _drop_expired_leases():
+    current_time = datetime.utcnow()
+    for lease_id, lease_expires in list(active_leases.items()):
+        if lease_expires <= current_time:
+            active_leases.pop(lease_id, None)
+    for task_id, lease in list(assigned_tasks.items()):
+        if current_time - lease["assigned_at"] >= TASK_RECLAIM_AFTER:
+            assigned_tasks.pop(task_id, None)
+    # Miners that never answered or came back would otherwise keep their
+    # entry for good
+    for wallet_address, (_, assigned_at) in list(wallet_tasks.items()):
+        if current_time - assigned_at >= TASK_RECLAIM_AFTER:
+            wallet_tasks.pop(wallet_address, None)
+
+
+def return_leases(lease_ids):
+    if not lease_ids:
+        return 0
+    result = AiTask.update_many(
+        {"lease_id": {"$in": lease_ids}, "status": "leased"},
+        {
+            "$set": {"status": "pending"},
+            "$unset": {"lease_id": "", "lease_expires": ""},
+        },
+    )
+    return result.modified_count
+
+
+async def release_leases():
+    await flush_assignments()
+    while not task_queue.empty():
+        task_queue.get_nowait()
+    lease_ids = list(active_leases.keys())
+    active_leases.clear()
+    try:
+        returned = await adb.run(return_leases, lease_ids)
+        logging.info(f"Returned {returned} leased tasks to AiTask.")
+    except PyMongoError as e:
+        logging.error(f"An error occurred in release_leases: {e}")
+
+
+async def run_task_dispatcher():
+    last_flush = 0.0
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            await refill_task_queue()
+            if loop.time() - last_flush >= FLUSH_INTERVAL:
+                await flush_assignments()
+                _drop_expired_leases()
+                last_flush = loop.time()
+            await asyncio.sleep(min(REFILL_INTERVAL, FLUSH_INTERVAL))
+    finally:
+        await release_leases()
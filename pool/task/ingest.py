@@ -0,0 +1,232 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+from pymongo.write_concern import WriteConcern
+
+from database import async_mongodb as adb
+from database.async_mongodb import AsyncCollection
+from database.mongodb import AiTask, ResponseTask
+from task.dispatcher import flush_assignments, take_assignment
+from task.activity import record_activity
+from task.score_aggregator import record_score
+from task.task import calculate_speed_score, update_validation_task
+from utils.layout import base
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s:%(levelname)s - %(message)s"
+)
+
+BATCH_SIZE = base["RESPONSE_INGEST"]["BATCH_SIZE"]
+FLUSH_INTERVAL = base["RESPONSE_INGEST"]["FLUSH_INTERVAL"]
+ACK_AFTER_COMMIT = base["RESPONSE_INGEST"]["ACK_AFTER_COMMIT"] == "True"
+
+_write_concern = WriteConcern(
+    w=base["RESPONSE_INGEST"]["WRITE_CONCERN"],
+    j=base["RESPONSE_INGEST"]["JOURNAL"] == "True",
+)
+_AiTask = AsyncCollection(AiTask.with_options(write_concern=_write_concern))
+_ResponseTask = AsyncCollection(
+    ResponseTask.with_options(write_concern=_write_concern)
+)
+
+# Accepted results waiting to be written, and the task ids among them so a
+# result cannot be accepted twice before it reaches the database
+pending_results = []
+pending_task_ids = set()
+
+_batch_ready = asyncio.Event()
+_flush_lock = asyncio.Lock()
+
+
+async def load_sent_task(task_id, wallet_address):
+    # Used when the task was not handed out by this process's dispatcher
+    task = await adb.AiTask.find_one({"id": task_id})
+
+    if not task:
+        return None, "Task not found"
+
+    # Check if the wallet address is associated with the task
+    if task["wallet"] != wallet_address:
+        return None, "Task not found or expired"
+
+    # Check if the task status is "sent"
+    if task["status"] != "sent":
+        return None, "Task already completed or invalid status"
+
+    return task, None
+
+
+async def handle_miner_response(task_id, wallet_address, output):
+    try:
+        if task_id in pending_task_ids:
+            return False, "Task already completed or invalid status"
+
+        lease = take_assignment(task_id, wallet_address)
+        if lease is None:
+            lease, message = await load_sent_task(task_id, wallet_address)
+            if lease is None:
+                return False, message
+
+        # Checked again as load_sent_task may have yielded to another response
+        if task_id in pending_task_ids:
+            return False, "Task already completed or invalid status"
+
+        result = {
+            "task_id": task_id,
+            "wallet_address": wallet_address,
+            "output": output,
+            "retrieve_id": lease["retrieve_id"],
+            "type": lease["type"],
+            "score": calculate_speed_score(lease["time"]),
+            "accepted_at": datetime.utcnow(),
+            "committed": asyncio.get_running_loop().create_future(),
+        }
+        pending_task_ids.add(task_id)
+        pending_results.append(result)
+        if len(pending_results) >= BATCH_SIZE:
+            _batch_ready.set()
+
+        if ACK_AFTER_COMMIT:
+            if not await result["committed"]:
+                return False, "Task Accepted but Failed to Store Response"
+            return True, "Task Accepted and Response Stored"
+        return True, "Task Accepted"
+
+    except Exception as e:
+        logging.error(f"An error occurred in handle_miner_response: {e}")
+        return False, str(e)
+
+
+def build_task_operations(results):
+    return [
+        UpdateOne(
+            {
+                "id": result["task_id"],
+                "wallet": result["wallet_address"],
+                "status": "sent",
+            },
+            {"$set": {"status": "completed", "output": result["output"]}},
+        )
+        for result in results
+    ]
+
+
+def build_response_operations(results):
+    expire_at = datetime.utcnow() + timedelta(minutes=3)
+    # Upserted on task_id so a batch retried after a partial failure
+    # does not store the same response twice
+    return [
+        UpdateOne(
+            {"task_id": result["task_id"]},
+            {
+                "$setOnInsert": {
+                    "retrieve_id": result["retrieve_id"],
+                    "wallet_address": result["wallet_address"],
+                    "output": result["output"],
+                    "expireAt": expire_at,
+                }
+            },
+            upsert=True,
+        )
+        for result in results
+    ]
+
+
+def completed_by(results):
+    # task id -> wallet that completed it, for the tasks of this batch
+    task_ids = [result["task_id"] for result in results]
+    tasks = AiTask.find(
+        {"id": {"$in": task_ids}, "status": "completed"}, {"id": 1, "wallet": 1}
+    )
+    return {task["id"]: task["wallet"] for task in tasks}
+
+
+async def commit_results(results):
+    # Assignments must be written first, completion only matches "sent" tasks
+    if not await flush_assignments():
+        return False
+
+    try:
+        task_result = await _AiTask.bulk_write(
+            build_task_operations(results), ordered=False
+        )
+        applied = results
+        if task_result.matched_count < len(results):
+            # Some tasks were no longer "sent" for this miner, e.g. the lease
+            # expired and another miner completed them; those earn nothing
+            owners = await adb.run(completed_by, results)
+            applied = []
+            for result in results:
+                if owners.get(result["task_id"]) == result["wallet_address"]:
+                    applied.append(result)
+                elif not result["committed"].done():
+                    result["committed"].set_result(False)
+            logging.info(
+                f"{len(results) - len(applied)} responses matched no sent task."
+            )
+        if applied:
+            await _ResponseTask.bulk_write(
+                build_response_operations(applied), ordered=False
+            )
+    except PyMongoError as e:
+        logging.error(f"An error occurred in commit_results: {e}")
+        return False
+
+    # Scores are written behind by the aggregator
+    for result in applied:
+        record_score(result["wallet_address"], result["score"], result["accepted_at"])
+        record_activity(result["wallet_address"], result["accepted_at"])
+
+    for result in applied:
+        if result["type"] == "high":
+            validation_update, validation_message = await adb.run(
+                update_validation_task,
+                result["task_id"],
+                result["output"],
+                result["wallet_address"],
+            )
+            if not validation_update:
+                logging.info(f"{validation_message}")
+    return True
+
+
+async def flush_results():
+    async with _flush_lock:
+        while pending_results:
+            batch = pending_results[:BATCH_SIZE]
+            del pending_results[:BATCH_SIZE]
+
+            committed = await commit_results(batch)
+            if not committed:
+                # Part of the batch may already be written, e.g. completed
+                # tasks without their responses, and the miner cannot submit
+                # those again. The batch is kept for the next flush, which
+                # commit_results can retry safely; miners waiting for the
+                # commit are told it failed.
+                for result in batch:
+                    if ACK_AFTER_COMMIT and not result["committed"].done():
+                        result["committed"].set_result(False)
+                pending_results[:0] = batch
+                return False
+
+            for result in batch:
+                pending_task_ids.discard(result["task_id"])
+                if not result["committed"].done():
+                    result["committed"].set_result(committed)
+        return True
+
+
+async def run_response_ingest():
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(_batch_ready.wait(), timeout=FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            _batch_ready.clear()
+            await flush_results()
+    finally:
+        await flush_results()
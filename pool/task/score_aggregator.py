@@ -0,0 +1,107 @@
+import asyncio
+import atexit
+import logging
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from database import async_mongodb as adb
+from database.mongodb import userStats
+from utils.layout import base
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s:%(levelname)s - %(message)s"
+)
+
+FLUSH_INTERVAL = base["SCORE_AGGREGATOR"]["FLUSH_INTERVAL"]
+
+# wallet -> score not yet added to userStats
+pending_scores = {}
+# wallet -> most recent activity not yet written to userStats
+pending_last_seen = {}
+
+_flush_lock = asyncio.Lock()
+
+
+def record_score(wallet_address, score, seen_at):
+    pending_scores[wallet_address] = pending_scores.get(wallet_address, 0) + score
+    previous = pending_last_seen.get(wallet_address)
+    if previous is None or seen_at > previous:
+        pending_last_seen[wallet_address] = seen_at
+
+
+def pending_score_stats():
+    return {
+        "wallets": len(pending_scores),
+        "score": sum(list(pending_scores.values())),
+    }
+
+
+def _take_pending():
+    global pending_scores, pending_last_seen
+    scores, last_seen = pending_scores, pending_last_seen
+    pending_scores, pending_last_seen = {}, {}
+    return scores, last_seen
+
+
+def _restore_pending(scores, last_seen):
+    for wallet_address, score in scores.items():
+        record_score(wallet_address, score, last_seen[wallet_address])
+
+
+def build_score_operations(scores, last_seen):
+    # $inc and $max commute, so batches may be applied in any order and
+    # concurrent writers (e.g. validator verdicts) are never overwritten
+    return [
+        UpdateOne(
+            {"wallet_address": wallet_address},
+            {
+                "$inc": {"score": score},
+                "$max": {"last_active_time": last_seen[wallet_address]},
+                "$setOnInsert": {"tp": 50, "np": 0, "balance": 0},
+            },
+            upsert=True,
+        )
+        for wallet_address, score in scores.items()
+    ]
+
+
+async def flush_scores():
+    async with _flush_lock:
+        scores, last_seen = _take_pending()
+        if not scores:
+            return True
+        try:
+            await adb.userStats.bulk_write(
+                build_score_operations(scores, last_seen), ordered=False
+            )
+        except PyMongoError as e:
+            logging.error(f"An error occurred in flush_scores: {e}")
+            _restore_pending(scores, last_seen)
+            return False
+        logging.info(f"Flushed score deltas for {len(scores)} miners.")
+        return True
+
+
+def flush_scores_on_exit():
+    # Last resort for exits that bypass the event loop's shutdown path
+    scores, last_seen = _take_pending()
+    if not scores:
+        return
+    try:
+        userStats.bulk_write(build_score_operations(scores, last_seen), ordered=False)
+        logging.info(f"Flushed score deltas for {len(scores)} miners on exit.")
+    except PyMongoError as e:
+        logging.error(f"An error occurred in flush_scores_on_exit: {e}")
+
+
+atexit.register(flush_scores_on_exit)
+
+
+async def run_score_aggregator():
+    try:
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await flush_scores()
+    finally:
+        await flush_scores()
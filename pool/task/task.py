@@ -1,22 +1,46 @@
 from faker import Faker
 from database.mongodb import (
     AiTask,
-    ResponseTask,
     ValidationTask,
     ValidationTaskHistory,
     userStats,
 )
+from database import async_mongodb as adb
+from database.db_requests import invalidate_miner_admission
+from task.activity import active_miner_counts
 from utils.layout import base
 from datetime import datetime, timedelta
 import uuid_utils as uuid
 import json
+from pymongo import ReturnDocument, UpdateOne
 from pymongo.errors import PyMongoError
 import math
 import logging
+import threading
+from collections import OrderedDict
 
 
 faker = Faker()
 
+# Lower values are served first
+PRIORITY_MAP = {"high": 1, "medium": 2, "low": 3}
+TASK_RECLAIM_AFTER = timedelta(minutes=2)
+
+MAX_ROUNDS = base["VALIDATION_ROUNDS"]["MAX_ROUNDS"]
+ROUND_BATCH_SIZE = base["VALIDATION_ROUNDS"]["BATCH_SIZE"]
+SAMPLING_RATE = base["VALIDATION_ROUNDS"]["SAMPLING_RATE"]
+ROUND_LIFETIME = timedelta(seconds=base["TIME"]["VALIDATION_DELETE_TIMER"])
+
+# Validators may answer a round for this long after it was created
+TASK_VALIDITY = timedelta(hours=1)
+UNKNOWN_TASK_RECHECK = timedelta(seconds=60)
+TASK_VALIDITY_CACHE_SIZE = 10000
+
+# val_id -> (until, valid), read from the validation socket's event loop and
+# the MongoDB executor
+_task_validity = OrderedDict()
+_validity_lock = threading.Lock()
+
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s:%(levelname)s - %(message)s"
 )
@@ -45,11 +69,12 @@ async def generate_task():
             "wallet": wallet_address,
             "status": status,
             "type": "medium",
+            "priority": PRIORITY_MAP["medium"],
             "message_type": message_type,
         }
 
         # Insert the task document into the AiTask collection
-        insert_result = AiTask.insert_one(task_document)
+        insert_result = await adb.AiTask.insert_one(task_document)
         # Check if the insertion was acknowledged by MongoDB
         if insert_result.acknowledged:
             return True
@@ -81,10 +106,11 @@ async def generate_automatic_task(walletAddress):
             "wallet": wallet_address,
             "status": status,
             "type": type,
+            "priority": PRIORITY_MAP[type],
             "message_type": message_type,
         }
 
-        insert_result = AiTask.insert_one(task_document)
+        insert_result = await adb.AiTask.insert_one(task_document)
         if insert_result.acknowledged:
             return {
                 "id": unique_id,
@@ -99,97 +125,69 @@ async def generate_automatic_task(walletAddress):
         return None
 
 
-async def update_task(document_id, wallet_address):
-    current_time = datetime.utcnow().isoformat()
-    update_result = AiTask.update_one(
-        {"id": document_id},
-        {"$set": {"wallet": wallet_address, "time": current_time, "status": "sent"}},
+def format_task(task):
+    return task["id"], json.dumps(
+        {
+            "id": task["id"],
+            "task": task["task"],
+            "seed": task.get("seed"),
+            "message_type": task.get("message_type"),
+        }
     )
-    return update_result.acknowledged
 
 
-async def find_task(wallet_address):
-    try:
-        two_minutes_ago = datetime.utcnow() - timedelta(minutes=2)
-
-        # First, check if the wallet_address has any 'sent' task that is not completed
-        pending_task = AiTask.find_one({"wallet": wallet_address, "status": "sent"})
+def claimable_filter(current_time):
+    # Pending tasks, tasks whose previous miner never answered and tasks whose
+    # dispatcher lease ran out, all served by the (status, priority, time) index.
+    stale_before = (current_time - TASK_RECLAIM_AFTER).isoformat()
+    return {
+        "$or": [
+            {"status": "pending"},
+            {"status": "sent", "time": {"$lt": stale_before}},
+            {"status": "leased", "lease_expires": {"$lt": current_time}},
+        ]
+    }
+
+
+def claim_task(wallet_address):
+    current_time = datetime.utcnow()
+
+    # Claimed in a single atomic step so two miners never receive the same task
+    return AiTask.find_one_and_update(
+        claimable_filter(current_time),
+        {
+            "$set": {
+                "wallet": wallet_address,
+                "time": current_time.isoformat(),
+                "status": "sent",
+            },
+            "$unset": {"lease_id": "", "lease_expires": ""},
+        },
+        sort=[("priority", 1), ("time", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
 
-        if pending_task:
 
-            return pending_task["id"], json.dumps(
-                {
-                    "id": pending_task["id"],
-                    "task": pending_task["task"],
-                    "seed": pending_task.get("seed"),
-                    "message_type": pending_task.get("message_type"),
-                }
+async def find_task(wallet_address, reuse_outstanding=True):
+    try:
+        # First, check if the wallet_address has any 'sent' task that is not
+        # completed. Session miners hold several tasks at once and skip this.
+        if reuse_outstanding:
+            pending_task = await adb.AiTask.find_one(
+                {"wallet": wallet_address, "status": "sent"}
             )
 
-        # Define a priority dictionary
-        priority_map = {"high": 1, "medium": 2, "low": 3}
-
-        # Find tasks sorted by time
-        tasks = AiTask.find().sort("time", 1)
-
-        # Convert cursor to a list
-        tasks_list = list(tasks)
-
-        # If no tasks found in db, generate a new automatic task
-        if not tasks_list:
+            if pending_task:
+                return format_task(pending_task)
 
-            new_task = await generate_automatic_task(wallet_address)
-            if new_task:
-                return new_task["id"], json.dumps(
-                    {
-                        "id": new_task["id"],
-                        "task": new_task["task"],
-                        "seed": new_task.get("seed"),
-                        "message_type": new_task.get("message_type"),
-                    }
-                )
-            else:
-                return None, None
-
-        # Sort tasks by priority if there are tasks
-        tasks_list.sort(key=lambda task: priority_map.get(task.get("type", "low"), 3))
-
-        for task in tasks_list:
-            if (
-                task["status"] == "sent"
-                and datetime.fromisoformat(task["time"]) < two_minutes_ago
-            ):
-                if await update_task(task["id"], wallet_address):
-                    return task["id"], json.dumps(
-                        {
-                            "id": task["id"],
-                            "task": task["task"],
-                            "seed": task.get("seed"),
-                            "message_type": task.get("message_type"),
-                        }
-                    )
-            elif task["status"] == "pending":
-                if await update_task(task["id"], wallet_address):
-                    return task["id"], json.dumps(
-                        {
-                            "id": task["id"],
-                            "task": task["task"],
-                            "seed": task.get("seed"),
-                            "message_type": task.get("message_type"),
-                        }
-                    )
+        task = await adb.run(claim_task, wallet_address)
+        if task:
+            return format_task(task)
 
         # If no suitable task is found, generate a new automatic task
         new_task = await generate_automatic_task(wallet_address)
         if new_task:
-            return new_task["id"], json.dumps(
-                {
-                    "id": new_task["id"],
-                    "task": new_task["task"],
-                    "seed": new_task.get("seed"),
-                    "message_type": new_task.get("message_type"),
-                }
-            )
+            return format_task(new_task)
         else:
             return None, None
     except Exception as e:
@@ -197,102 +195,23 @@ async def find_task(wallet_address):
         return None, None
 
 
-async def store_response(task_id, wallet_address, output, retrieve_id):
+def migrate_task_priority():
+    # Tasks created before priority was stored would otherwise sort ahead of
+    # everything else, so backfill them from their type.
     try:
-        # Calculate the expiration time
-        expire_at = datetime.utcnow() + timedelta(minutes=3)
-
-        # Create the response document
-        response_document = {
-            "retrieve_id": retrieve_id,
-            "wallet_address": wallet_address,
-            "output": output,
-            "task_id": task_id,
-            "expireAt": expire_at,
-        }
-
-        # Insert the response document into the ResponseTask collection
-        insert_result = ResponseTask.insert_one(response_document)
-
-        if insert_result.acknowledged:
-            return True, "Response stored successfully"
-        else:
-            return False, "Failed to store response"
-
-    except Exception as e:
-        logging.error(f"An error occurred in store_response: {e}")
-        return False, str(e)
-
-
-async def handle_miner_response(task_id, wallet_address, output):
-    try:
-        # Find the task by ID
-        task = AiTask.find_one({"id": task_id})
-
-        if not task:
-            return False, "Task not found"
-
-        # Check if the wallet address is associated with the task
-        if task["wallet"] != wallet_address:
-            return False, "Task not found or expired"
-
-        print(f'wallet: {task["wallet"]}, passed: {wallet_address} ')
-
-        # Check if the task status is "sent"
-        if task["status"] != "sent":
-            return False, "Task already completed or invalid status"
-
-        retrieve_id = task["retrieve_id"]
-        time = task["time"]
-        type = task["type"]
-
-        # If all checks pass, update the task status to "completed" and add the output
-        update_result = AiTask.update_one(
-            {"id": task_id}, {"$set": {"status": "completed", "output": output}}
+        for task_type, priority in PRIORITY_MAP.items():
+            AiTask.update_many(
+                {"priority": {"$exists": False}, "type": task_type},
+                {"$set": {"priority": priority}},
+            )
+        AiTask.update_many(
+            {"priority": {"$exists": False}},
+            {"$set": {"priority": PRIORITY_MAP["low"]}},
         )
-
-        if update_result.modified_count > 0:
-            try:
-                # Call update_validation_task if the task type is "high"
-                if type == "high":
-                    validation_update, validation_message = update_validation_task(
-                        task_id, output, wallet_address
-                    )
-                    if not validation_update:
-                        logging.info(f"{validation_message}")
-
-                # Call the store_response function after successfully updating the task status
-                store_success, store_message = await store_response(
-                    task_id, wallet_address, output, retrieve_id
-                )
-
-                # Calculate the score and update user info
-                score = calculate_speed_score(time)
-                success, message = upsert_user_info(wallet_address, score)
-
-                if not success:
-                    return False, message
-
-                if store_success:
-                    return True, "Task Accepted and Response Stored"
-                else:
-                    return (
-                        False,
-                        f"Task Accepted but Failed to Store Response: {store_message}",
-                    )
-
-            except Exception as store_error:
-                return (
-                    False,
-                    f"Error in storing response or updating user info: {store_error}",
-                )
-
-        else:
-            return False, "Task Rejected"
-
-    except Exception as e:
-        logging.error(f"An error occurred in handle_miner_response: {e}")
-        return False, str(e)
+        return True
+    except PyMongoError as e:
+        logging.error(f"An error occurred in migrate_task_priority: {e}")
+        return False
 
 
 # ###########---------------------------------###################################
@@ -329,66 +248,15 @@ def calculate_speed_score(task_completion_time_utc):
         return 0
 
 
-def upsert_user_info(wallet_address, score=None):
-    # Define default values
-    default_tp = 50
-    default_np = 0
-    default_score = 0
-    default_balance = 0
-
-    try:
-        # Try to find the user
-        user = userStats.find_one({"wallet_address": wallet_address})
-
-        if user:
-            # Update existing user
-            update_doc = {"$set": {"last_active_time": datetime.utcnow()}}
-            if score is not None:
-                update_doc["$inc"] = {"score": score}
-
-            userStats.update_one({"wallet_address": wallet_address}, update_doc)
-            return True, f"User updated with wallet_address: {wallet_address}"
-
-        else:
-            # Create new user
-            new_user = {
-                "wallet_address": wallet_address,
-                "last_active_time": datetime.utcnow(),
-                "tp": default_tp,
-                "np": default_np,
-                "score": score if score is not None else default_score,
-                "balance": default_balance,
-            }
-            userStats.insert_one(new_user)
-            return True, f"New user created with wallet_address: {wallet_address}"
-
-    except PyMongoError as e:
-        return False, f"An error occurred while updating upsert_user_info: {e}"
-
-
 def add_processed_validator(val_id, validator_address):
     try:
-        # Find the document with the given val_id
-        query = {"task1.val_id": val_id}
-        task = ValidationTask.find_one(query)
-
-        if task:
-            # Check if the validator_address is already in the list
-            if validator_address not in task.get("task1", {}).get("validators", []):
-                # Add the validator_address to the validators list
-                updated_validators = task.get("task1", {}).get("validators", []) + [
-                    validator_address
-                ]
-
-                # Update the document
-                update_result = ValidationTask.update_one(
-                    query, {"$set": {"task1.validators": updated_validators}}
-                )
-
-                if update_result.modified_count == 1:
-                    return True
-
-        return False
+        # $addToSet keeps concurrent acknowledgements from overwriting each
+        # other and ignores a validator that is already listed
+        update_result = ValidationTask.update_one(
+            {"task1.val_id": val_id},
+            {"$addToSet": {"task1.validators": validator_address}},
+        )
+        return update_result.modified_count == 1
 
     except Exception as e:
         logging.error(
@@ -397,119 +265,199 @@ def add_processed_validator(val_id, validator_address):
         return False
 
 
-def is_task_valid(val_id: str) -> bool:
-    try:
-        # Find the document with the given val_id
-        query = {"val_id": val_id}
-        task = ValidationTaskHistory.find_one(query)
+def get_cached_task_validity(val_id):
+    current_time = datetime.utcnow()
+    with _validity_lock:
+        entry = _task_validity.get(val_id)
+        if entry is None:
+            return None
+        until, valid = entry
+        if until <= current_time:
+            del _task_validity[val_id]
+            return None
+        return valid
 
-        if not task:
-            # If no document is found, return False
-            return False
 
-        # Parse the createdAt field
-        created_at_str = task.get("createdAt")
-        created_at = datetime.fromisoformat(created_at_str)
+def remember_task_validity(val_id, valid_until):
+    current_time = datetime.utcnow()
+    # Unknown or expired ids are remembered as invalid for a short while so
+    # repeated messages for them stay off the database
+    if valid_until > current_time:
+        entry = (valid_until, True)
+    else:
+        entry = (current_time + UNKNOWN_TASK_RECHECK, False)
+    with _validity_lock:
+        _task_validity[val_id] = entry
+        _task_validity.move_to_end(val_id)
+        while len(_task_validity) > TASK_VALIDITY_CACHE_SIZE:
+            _task_validity.popitem(last=False)
+    return entry[1]
 
-        # Get the current time
-        current_time = datetime.utcnow()
 
-        # Check if more than 1 hour has passed
-        if current_time - created_at > timedelta(hours=1):
-            return False
+def history_valid_until(history):
+    # Older history entries only carry the ISO createdAt string
+    if history.get("expireAt") is not None:
+        return history["expireAt"]
+    return datetime.fromisoformat(history["createdAt"]) + TASK_VALIDITY
 
-        return True
+
+def load_task_validity(val_id):
+    try:
+        history = ValidationTaskHistory.find_one({"val_id": val_id})
+        if not history:
+            return remember_task_validity(val_id, datetime.min)
+        return remember_task_validity(val_id, history_valid_until(history))
 
     except Exception as e:
         logging.error(
-            f"An error occurred while checking task validity in is_task_valid: {e}"
+            f"An error occurred while checking task validity in load_task_validity: {e}"
         )
         return False
 
 
-def miner_eligibility(wallet_address: str) -> bool:
+def migrate_task_history_expiry():
+    # History entries written before expireAt was stored are never removed by
+    # the TTL index, so backfill it from createdAt. Entries past their window
+    # are then removed by the next TTL pass.
     try:
-        # Find the document with the given wallet_address
-        query = {"wallet_address": wallet_address}
-        user_stat = userStats.find_one(query)
+        operations = []
+        for history in ValidationTaskHistory.find(
+            {"expireAt": {"$exists": False}}, {"createdAt": 1}
+        ):
+            try:
+                expire_at = history_valid_until(history)
+            except (KeyError, TypeError, ValueError):
+                expire_at = datetime.utcnow()
+            operations.append(
+                UpdateOne({"_id": history["_id"]}, {"$set": {"expireAt": expire_at}})
+            )
+            if len(operations) >= 1000:
+                ValidationTaskHistory.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            ValidationTaskHistory.bulk_write(operations, ordered=False)
+        return True
+    except PyMongoError as e:
+        logging.error(f"An error occurred in migrate_task_history_expiry: {e}")
+        return False
 
-        if not user_stat:
-            # If no document is found, return True
-            return True
 
-        # Check the np field
-        if user_stat.get("np", 0) > 45:
-            return False
+def seed_task_validity():
+    # Loads the rounds still within their validity window after a restart
+    try:
+        histories = ValidationTaskHistory.find(
+            {"expireAt": {"$gt": datetime.utcnow()}}, {"val_id": 1, "expireAt": 1}
+        )
+        count = 0
+        for history in histories:
+            remember_task_validity(history["val_id"], history["expireAt"])
+            count += 1
+        logging.info(f"Seeded validity of {count} validation rounds.")
+    except PyMongoError as e:
+        logging.error(f"An error occurred in seed_task_validity: {e}")
 
-        return True
 
-    except Exception as e:
-        logging.error(f"An error occurred in miner_eligibility: {e}")
-        return False
+# ###########---------------------------------###################################
 
 
-# ###########---------------------------------###################################
+def parse_validation_verdicts(entries):
+    # Checks the whole payload before anything is written and sums the
+    # increments per wallet; tp wins over np as before
+    if not isinstance(entries, list):
+        return None, "Missing tasks"
+    increments = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            return None, "Invalid task entry"
+        wallet_address = entry.get("wallet_address")
+        if not isinstance(wallet_address, str) or not wallet_address:
+            return None, "Missing wallet_address"
+        if entry.get("tp") is not None:
+            field, value = "tp", entry["tp"]
+        elif entry.get("np") is not None:
+            field, value = "np", entry["np"]
+        else:
+            return None, f"Missing tp or np for {wallet_address}"
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None, f"Invalid {field} for {wallet_address}"
+        wallet_increments = increments.setdefault(wallet_address, {})
+        wallet_increments[field] = wallet_increments.get(field, 0) + value
+    return increments, None
+
 
+def apply_validation_verdicts(entries):
+    increments, error = parse_validation_verdicts(entries)
+    if increments is None:
+        return False, error
+    if not increments:
+        return True, {}
 
-def task_validation_output(wallet_address, tp=None, np=None):
-    print("*" * 45)
-    print("wallet_address", wallet_address)
-    print("TP", tp)
-    print("NP", np)
-    print("*" * 45)
     try:
-        # Find the user by wallet address
-        user = userStats.find_one({"wallet_address": wallet_address})
-        if not user:
-            return False, "Miner not found"
-
-        # Prepare the update document
-        update_doc = {"$inc": {}}
-        if tp is not None:
-            update_doc["$inc"]["tp"] = tp
-        if np is not None:
-            update_doc["$inc"]["np"] = np
-
-        # If there are no updates to perform, return early
-        if not update_doc["$inc"]:
-            return False, "No changes to update"
-
-        # Update the user stats
-        userStats.update_one({"wallet_address": wallet_address}, update_doc)
-        return True, f"User validated with wallet_address: {wallet_address}"
-    except Exception as e:
-        return False, f"An error occurred in task_validation_output: {e}"
+        result = userStats.bulk_write(
+            [
+                UpdateOne({"wallet_address": wallet_address}, {"$inc": inc})
+                for wallet_address, inc in increments.items()
+            ],
+            ordered=False,
+        )
+        found = set(increments)
+        if result.matched_count < len(increments):
+            # Only read back which miners exist when some were not matched
+            found = {
+                user["wallet_address"]
+                for user in userStats.find(
+                    {"wallet_address": {"$in": list(increments)}},
+                    {"wallet_address": 1},
+                )
+            }
+    except PyMongoError as e:
+        return False, f"An error occurred in apply_validation_verdicts: {e}"
+
+    # Only reaches caches in this process, others expire by TTL
+    invalidate_miner_admission(*found)
+    return True, {
+        wallet_address: (
+            (True, "User validated")
+            if wallet_address in found
+            else (False, "Miner not found")
+        )
+        for wallet_address in increments
+    }
 
 
 def update_validation_task(task_id, output, wallet_address):
     try:
-        # Find the task in the ValidationTask collection
-        task = ValidationTask.find_one({"task1.array.id": task_id})
-
-        if not task:
-            return False, "ValidationTask  does not exist"
-
-        # Update the specific task within the array
-        ValidationTask.update_one(
-            {"task1.array.id": task_id},
+        # Marks the task completed and bumps the round's counter in one write.
+        # Only a task not yet completed matches, so a repeated answer is not
+        # counted twice
+        task = ValidationTask.find_one_and_update(
+            {
+                "task1.array": {
+                    "$elemMatch": {"id": task_id, "status": {"$ne": "completed"}}
+                }
+            },
             {
                 "$set": {
                     "task1.array.$.wallet": wallet_address,
                     "task1.array.$.status": "completed",
                     "task1.array.$.output": output,
-                }
+                },
+                "$inc": {"task1.completed": 1},
             },
+            projection={
+                "completed": "$task1.completed",
+                "size": {"$size": "$task1.array"},
+            },
+            return_document=ReturnDocument.AFTER,
         )
 
-        # Check if all tasks in the array are completed
-        task = ValidationTask.find_one({"task1.array.id": task_id})
-        all_completed = all(
-            item["status"] == "completed" for item in task["task1"]["array"]
-        )
+        if not task:
+            return False, "ValidationTask  does not exist or is already completed"
 
-        if all_completed:
+        if task["completed"] >= task["size"]:
             ValidationTask.update_one(
-                {"task1.array.id": task_id}, {"$set": {"task1.condition": "dispatch"}}
+                {"_id": task["_id"], "task1.condition": "pending"},
+                {"$set": {"task1.condition": "dispatch"}},
             )
             logging.info(f"Task is has been dispatched for validation ")
 
@@ -519,123 +467,142 @@ def update_validation_task(task_id, output, wallet_address):
         return False, f"An error occurred in update_validation_task: {e}"
 
 
-async def generate_validation_task():
-    try:
-        # Check if the validationTask collection is empty
-        if ValidationTask.count_documents({}) == 0:
-            # Generate random text for the task
-            random_text = faker.text()
-            seed = "123"
-            message_type = "requestedTask"
-
-            # Create the array of tasks
-            tasks_array = []
-            for _ in range(3):
-                unique_id = str(uuid.uuid4())
-                val_id = str(uuid.uuid7())
-                retrieve_id = str(uuid.uuid4())
-                current_time = datetime.utcnow().isoformat()
-
-                task_document = {
-                    "id": unique_id,
-                    "seed": seed,
-                    "task": random_text,
-                    "time": current_time,
-                    "retrieve_id": retrieve_id,
-                    "wallet": "",
-                    "status": "pending",
-                    "type": "high",
-                    "message_type": message_type,
-                }
-                tasks_array.append(task_document)
-
-                validators = []
-
-            # Create the validation task document
-            validation_task_document = {
-                "task1": {
-                    "val_id": val_id,
-                    "condition": "pending",
-                    "createdAt": current_time,
-                    "validators": validators,
-                    "array": tasks_array,
-                }
+def target_validation_rounds():
+    # Enough rounds to sample SAMPLING_RATE of the recently active miners,
+    # BATCH_SIZE tasks at a time
+    active_miners = active_miner_counts()["15m"]
+    wanted = math.ceil(active_miners * SAMPLING_RATE / ROUND_BATCH_SIZE)
+    return min(MAX_ROUNDS, max(1, wanted))
+
+
+def validation_round_cutoff():
+    return (datetime.utcnow() - ROUND_LIFETIME).isoformat()
+
+
+async def expire_validation_rounds():
+    # createdAt is an ISO string, which orders the same way as the time
+    result = await adb.ValidationTask.delete_many(
+        {"task1.createdAt": {"$lt": validation_round_cutoff()}}
+    )
+    if result.deleted_count:
+        logging.info(f"Expired {result.deleted_count} validation rounds.")
+    return result.deleted_count
+
+
+async def create_validation_round():
+    # Generate random text for the task
+    random_text = faker.text()
+    seed = "123"
+    message_type = "requestedTask"
+    val_id = str(uuid.uuid7())
+    created_at = datetime.utcnow()
+    current_time = created_at.isoformat()
+
+    # Create the array of tasks
+    tasks_array = []
+    for _ in range(ROUND_BATCH_SIZE):
+        tasks_array.append(
+            {
+                "id": str(uuid.uuid4()),
+                "seed": seed,
+                "task": random_text,
+                "time": current_time,
+                "retrieve_id": str(uuid.uuid4()),
+                "wallet": "",
+                "status": "pending",
+                "type": "high",
+                "message_type": message_type,
             }
+        )
 
-            validation_task_History = {
-                "val_id": val_id,
-                "createdAt": current_time,
+    # Each round moves pending -> dispatch once all its tasks are answered,
+    # and is removed after VALIDATION_DELETE_TIMER either way
+    validation_task_document = {
+        "task1": {
+            "val_id": val_id,
+            "condition": "pending",
+            "createdAt": current_time,
+            "completed": 0,
+            "validators": [],
+            "array": tasks_array,
+        }
+    }
+
+    # expireAt drives the TTL index that keeps the history bounded
+    validation_task_History = {
+        "val_id": val_id,
+        "createdAt": current_time,
+        "expireAt": created_at + TASK_VALIDITY,
+    }
+
+    insert_result = await adb.ValidationTask.insert_one(validation_task_document)
+    await adb.ValidationTaskHistory.insert_one(validation_task_History)
+    if not insert_result.acknowledged:
+        return False
+
+    await adb.AiTask.insert_many(
+        [
+            {
+                **task,
+                "type": "high",
+                "priority": PRIORITY_MAP["high"],
             }
+            for task in tasks_array
+        ]
+    )
+    return True
 
-            # Insert the validation task document into the validationTask collection
-            insert_result = ValidationTask.insert_one(validation_task_document)
-            insert_history = ValidationTaskHistory.insert_one(validation_task_History)
-            # Check if the insertion was acknowledged by MongoDB
-            if insert_result.acknowledged:
-                # Insert each task_document into the AiTask collection
-                for task in tasks_array:
-                    ai_task_document = {
-                        "id": task["id"],
-                        "seed": task["seed"],
-                        "task": task["task"],
-                        "time": task["time"],
-                        "retrieve_id": task["retrieve_id"],
-                        "wallet": task["wallet"],
-                        "status": task["status"],
-                        "type": "high",
-                        "message_type": task["message_type"],
-                    }
-                    AiTask.insert_one(ai_task_document)
-                return True
-            else:
-                return False
-        else:
-            logging.error("ValidationTask collection is not empty. Skipping insertion.")
+
+async def generate_validation_task():
+    try:
+        await expire_validation_rounds()
+        in_flight = await adb.ValidationTask.count_documents(
+            {"task1.condition": {"$in": ["pending", "dispatch"]}}
+        )
+        missing = target_validation_rounds() - in_flight
+        if missing <= 0:
+            logging.info(
+                f"{in_flight} validation rounds in flight. Skipping insertion."
+            )
             return False
+
+        created = 0
+        for _ in range(missing):
+            if await create_validation_round():
+                created += 1
+        logging.info(f"Created {created} validation rounds.")
+        return created > 0
     except Exception as e:
         logging.error(f"An error occurred in generate_validation_task: {e}")
         return False
 
 
-async def select_task_for_validation():
+async def select_tasks_for_validation():
     try:
-        # Find the first task
-        task = ValidationTask.find_one({})
-
-        if not task:
-            return False, json.dumps({"error": "No tasks found"})
-
-        current_time = datetime.utcnow()
-        task_created_at = datetime.strptime(
-            task["task1"]["createdAt"], "%Y-%m-%dT%H:%M:%S.%f"
+        # Every unexpired round whose tasks have all been answered, oldest
+        # first; a round stays selectable so validators that come online
+        # later are still contacted
+        tasks = await adb.ValidationTask.find_list(
+            {
+                "task1.condition": "dispatch",
+                "task1.createdAt": {"$gte": validation_round_cutoff()},
+            },
+            sort=[("task1.createdAt", 1)],
         )
-        time_difference = current_time - task_created_at
-
-        timer = base["TIME"]["VALIDATION_DELETE_TIMER"]
-        if time_difference > timedelta(minutes=timer):
-            print("Time difference is greater than 3 minute")
-            if (
-                task["task1"]["condition"] == "pending"
-                or task["task1"]["condition"] == "dispatch"
-            ):
-                ValidationTask.delete_one({"_id": task["_id"]})
-                return False, json.dumps(
-                    {
-                        "error": "Task is pending/dispatch for more than 3 minutes, hence deleted"
-                    }
-                )
 
-        # Check the condition
-        if task["task1"]["condition"] != "dispatch":
-            return False, json.dumps({"error": "Task condition is not dispatch"})
+        if not tasks:
+            return False, json.dumps({"error": "No tasks found"})
 
         # If all checks pass, return the details as JSON
         return True, json.dumps(
-            {
-                "id": task["task1"]["val_id"],
-                "validators": task["task1"]["validators"],
-                "array": task["task1"]["array"],
-            }
+            [
+                {
+                    "id": task["task1"]["val_id"],
+                    "validators": task["task1"]["validators"],
+                    "array": task["task1"]["array"],
+                }
+                for task in tasks
+            ]
         )
 
     except Exception as e:
@@ -0,0 +1,43 @@
+# Run from the pool directory:
+#   python3 -m unittest discover -s tests -t .
+import unittest
+from unittest import mock
+
+from database import indexes
+
+
+def failing_on(failed_collection, failed_keys):
+    def apply_index(collection, keys, options):
+        if collection == failed_collection and keys == failed_keys:
+            return False, "E11000 duplicate key error"
+        return True, "ok"
+
+    return apply_index
+
+
+class RequiredIndexesTest(unittest.TestCase):
+    def setUp(self):
+        patch = mock.patch.object(indexes, "db", {name: name for name in indexes.INDEXES})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_other_failures_do_not_block_startup(self):
+        with mock.patch.object(
+            indexes, "apply_index", failing_on("userStats", [("wallet_address", 1)])
+        ):
+            results = indexes.ensure_indexes()
+
+        self.assertFalse(results[("userStats", (("wallet_address", 1),))][0])
+        self.assertTrue(indexes.required_indexes_applied(results))
+
+    def test_missing_hash_index_blocks_startup(self):
+        with mock.patch.object(
+            indexes, "apply_index", failing_on("blockTransactions", [("hash", 1)])
+        ):
+            results = indexes.ensure_indexes()
+
+        self.assertFalse(indexes.required_indexes_applied(results))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+# Run from the pool directory:
+#   python3 -m unittest discover -s tests -t .
+import unittest
+from unittest import mock
+
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from database import miner_registry as registry
+
+
+class StandaloneSession:
+    # Session of a standalone server, which rejects transactions
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def with_transaction(self, callback):
+        raise OperationFailure(
+            "Transaction numbers are only allowed on a replica set member",
+            code=registry.TRANSACTIONS_UNSUPPORTED,
+        )
+
+
+class StandaloneRegistrationTest(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(registry, "miners"),
+            mock.patch.object(registry, "challenges"),
+            mock.patch.object(registry, "db"),
+            mock.patch.object(registry, "load_registry"),
+            mock.patch.object(registry, "MAX_MINERS", 1),
+            mock.patch.dict(registry.registered_wallets, {"wallet0": 1}, clear=True),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        registry.db.client.start_session.return_value = StandaloneSession()
+        self.miner_data = {"wallet_address": "wallet1", "difficulty": 5}
+        self.challenge_data = {"index": 7, "result_hash": "hash7"}
+        self.count = registry.challenge_count
+
+    def test_no_free_slot_writes_nothing(self):
+        registry.miners.find_one_and_delete.return_value = None
+
+        success, message = registry.commit_registration(
+            self.miner_data, self.challenge_data
+        )
+
+        self.assertFalse(success)
+        self.assertIn("immunity", message)
+        registry.miners.insert_one.assert_not_called()
+        registry.challenges.insert_one.assert_not_called()
+        self.assertEqual(registry.challenge_count, self.count)
+        self.assertNotIn("wallet1", registry.registered_wallets)
+
+    def test_challenge_conflict_reverts_eviction(self):
+        evicted = {"wallet_address": "wallet0", "miner_id": 1}
+        registry.miners.find_one_and_delete.return_value = evicted
+        registry.challenges.insert_one.side_effect = DuplicateKeyError(
+            "E11000 duplicate key error index: index_1"
+        )
+
+        success, _ = registry.commit_registration(
+            self.miner_data, self.challenge_data
+        )
+
+        self.assertFalse(success)
+        registry.miners.delete_one.assert_called_once_with(
+            {"wallet_address": "wallet1", "miner_id": 1}
+        )
+        registry.miners.insert_one.assert_called_with(evicted)
+        registry.load_registry.assert_called_once()
+        self.assertEqual(registry.registered_wallets, {"wallet0": 1})
+
+    def test_registration_evicts_and_advances_state(self):
+        registry.miners.find_one_and_delete.return_value = {
+            "wallet_address": "wallet0",
+            "miner_id": 1,
+        }
+        registry.challenges.insert_one.return_value.inserted_id = "challenge7"
+
+        success, result = registry.commit_registration(
+            self.miner_data, self.challenge_data
+        )
+
+        self.assertTrue(success)
+        self.assertEqual(result, {"challenge_id": "challenge7", "evicted": "wallet0"})
+        self.assertEqual(registry.registered_wallets, {"wallet1": 1})
+        self.assertEqual(registry.challenge_count, self.count + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+# Run from the pool directory:
+#   python3 -m unittest discover -s tests -t .
+import unittest
+from unittest import mock
+
+from pymongo import UpdateOne
+
+from reward_logic import miner_reward as reward
+
+
+def apply_credit(balance, update):
+    # Evaluates the balance_credit pipeline the way the server does
+    rounding = update[0]["$set"]["balance"]["$round"]
+    _, credit = rounding[0]["$add"]
+    return round((balance or 0) + credit, rounding[1])
+
+
+class BaseUnitsTest(unittest.TestCase):
+    def test_conversion_is_exact_to_8_decimals(self):
+        self.assertEqual(reward.to_base_units(0.1 + 0.2), 30000000)
+        self.assertEqual(reward.to_base_units("1000.12345678"), 100012345678)
+        self.assertEqual(reward.from_base_units(100012345678), 1000.12345678)
+
+    def test_shares_sum_to_amount(self):
+        amount = reward.to_base_units(1000.12345678)
+        scores = [
+            (f"wallet{i}", reward.to_base_units(score))
+            for i, score in enumerate([0.1, 0.2, 0.3, 1 / 3, 7.77])
+        ]
+
+        shares = reward.distribute_shares(amount, scores)
+
+        self.assertEqual(sum(shares.values()), amount)
+        self.assertTrue(all(isinstance(share, int) for share in shares.values()))
+
+    def test_ties_go_to_the_lower_wallet(self):
+        shares = reward.distribute_shares(10, [("b", 1), ("a", 1), ("c", 1)])
+        self.assertEqual(shares, {"a": 4, "b": 3, "c": 3})
+
+
+class BalanceCreditTest(unittest.TestCase):
+    def test_repeated_credits_do_not_drift(self):
+        balance = None
+        for _ in range(1000):
+            balance = apply_credit(balance, reward.balance_credit(10000000))
+        self.assertEqual(balance, 100.0)
+
+    def test_credit_clears_settlement(self):
+        self.assertEqual(reward.balance_credit(1)[1], {"$unset": "settlement"})
+
+    def test_pay_chunk_credits_stored_share(self):
+        chunk = [{"_id": 1, "settlement": {"share": 150000000}}]
+        with mock.patch.object(reward, "userStats") as userStats:
+            userStats.bulk_write.return_value.modified_count = 1
+
+            paid = reward.pay_chunk("1000-1010", chunk)
+
+        self.assertEqual(paid, 1)
+        (operations,), _ = userStats.bulk_write.call_args
+        self.assertEqual(
+            operations,
+            [
+                UpdateOne(
+                    {"_id": 1, "settlement.block_range": "1000-1010"},
+                    reward.balance_credit(150000000),
+                )
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+# Run from the pool directory:
+#   python3 -m unittest discover -s tests -t .
+import unittest
+from unittest import mock
+
+from pymongo.errors import DuplicateKeyError
+
+from reward_logic import pool_reward
+
+
+class PoolRewardTest(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(pool_reward, "entityOwners"),
+            mock.patch.object(pool_reward, "rewardSettlements"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        pool_reward.entityOwners.find_one.return_value = {
+            "_id": "entityOwners",
+            "amount": 1.5,
+            "wallet_address": "owner",
+        }
+
+    def test_credits_range_and_marks_it_paid(self):
+        pool_reward.rewardSettlements.find_one.return_value = {"block_range": "1-2"}
+
+        pool_reward.update_pool_reward(2, "1-2")
+
+        query, update = pool_reward.entityOwners.update_one.call_args[0]
+        self.assertEqual(query["block_range"], {"$ne": "1-2"})
+        self.assertEqual(update["$set"]["amount"], 3.5)
+        self.assertEqual(update["$set"]["block_range"], "1-2")
+        pool_reward.rewardSettlements.update_one.assert_called_once_with(
+            {"block_range": "1-2"}, {"$set": {"owner_paid": True}}
+        )
+
+    def test_rerun_of_a_paid_range_is_skipped(self):
+        pool_reward.rewardSettlements.find_one.return_value = {
+            "block_range": "1-2",
+            "owner_paid": True,
+        }
+
+        pool_reward.update_pool_reward(2, "1-2")
+
+        pool_reward.entityOwners.update_one.assert_not_called()
+
+    def test_crash_before_flag_does_not_credit_twice(self):
+        # The owner document already carries the range, so the guarded upsert
+        # collides on _id instead of crediting again
+        pool_reward.rewardSettlements.find_one.return_value = {"block_range": "1-2"}
+        pool_reward.entityOwners.update_one.side_effect = DuplicateKeyError("dup")
+
+        pool_reward.update_pool_reward(2, "1-2")
+
+        pool_reward.rewardSettlements.update_one.assert_called_once_with(
+            {"block_range": "1-2"}, {"$set": {"owner_paid": True}}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
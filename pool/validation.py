@@ -6,13 +6,21 @@ import time
 import logging
 import utils.config as config
 import requests
+from api import http_client
 from datetime import datetime, timedelta
 import sys
 from api.api_client import test_api_connection
+from protocol import connections
 from protocol.protocol import validation_protocol
 from database.mongodb import test_db_connection
+from database.indexes import ensure_indexes
 from utils.layout import base
-from task.task import select_task_for_validation, add_processed_validator
+from database import async_mongodb as adb
+from task.task import (
+    add_processed_validator,
+    seed_task_validity,
+    select_tasks_for_validation,
+)
 
 
 logging.basicConfig(
@@ -24,6 +32,9 @@ logging.getLogger("websockets").setLevel(logging.INFO)
 
 websockets_dict = {}
 
+FANOUT_MAX_CONCURRENT = base["VALIDATION_FANOUT"]["MAX_CONCURRENT"]
+FANOUT_TIMEOUT = base["VALIDATION_FANOUT"]["TIMEOUT"]
+
 
 def read_peers(file_path):
     valid_peers = []
@@ -127,7 +138,7 @@ def save_valid_peers_to_json(vals):
 
 def fetch_validators(validators):
     try:
-        response = requests.get(validators)
+        response = http_client.get(validators)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.HTTPError as errh:
@@ -151,15 +162,11 @@ def fetch_peer_periodically(interval=600):
         time.sleep(interval)
 
 
-async def send_response_to_validator(validator_info, message):
+async def send_response_to_validator(validator_info, message, timeout=60, val_id=None):
     uri = validator_info
     try:
-        async with websockets.connect(uri) as websocket:
-            logging.info(f"Now connected with validator: {uri}")
-            await websocket.send(message)
-            response = await asyncio.wait_for(websocket.recv(), timeout=60)
-            await websocket.close()
-            return response
+        # Rides a long-lived connection to the validator, opened on first use
+        return await connections.request(uri, message, key=val_id, timeout=timeout)
     except asyncio.TimeoutError:
         logging.error(f"Timeout when sending message to {uri}")
     except Exception as e:
@@ -167,21 +174,96 @@ async def send_response_to_validator(validator_info, message):
     return None
 
 
+async def dispatch_to_validator(validator_id, validator_uri, data, val_id, semaphore):
+    async with semaphore:
+        logging.info(f"Processing validator {validator_id} with URI {validator_uri}")
+        response = await send_response_to_validator(
+            validator_uri, data, timeout=FANOUT_TIMEOUT, val_id=val_id
+        )
+    logging.info(f"Response from validator {validator_id}: {response}")
+    if response is None:
+        return False
+    if response.startswith("ERROR:"):
+        logging.error(f"Validator {validator_id} responded with error: {response}")
+        return False
+
+    try:
+        parsed_message = json.loads(response)
+    except json.JSONDecodeError:
+        logging.error(f"Failed to parse JSON response from validator {validator_id}.")
+        return False
+
+    if parsed_message.get("type") != "taskReceived":
+        return False
+
+    val_id = parsed_message.get("val_id")
+    validator_wallet = parsed_message.get("validator_wallet")
+    update = await adb.run(add_processed_validator, val_id, validator_wallet)
+    if update:
+        logging.info(f"Task updated successfully for validator {validator_wallet}.")
+    else:
+        logging.info(f"Failed to update task for validator {validator_wallet}.")
+    return update
+
+
+async def dispatch_round(task, peers, semaphore):
+    # temp_peers will contain the validators uri to connect
+    temp_peers = [
+        (validator_id, validator_info)
+        for validator_id, validator_info in peers
+        if validator_id not in task.get("validators", [])
+    ]
+
+    logging.info(f"temp_peers for {task['id']}: {temp_peers}")
+
+    data = json.dumps(
+        {
+            "val_id": task["id"],
+            "pool_wallet": base["POOL_WALLETS"]["POOL_ADDRESS"],
+            "task_info": task["array"],
+            "type": "validateTask",
+            "pool_ip": base["POOL_VALIDATION_SOCKET"]["IP"],
+            "pool_port": base["POOL_VALIDATION_SOCKET"]["PORT"],
+        }
+    )
+
+    # Every validator is contacted at once, so a round lasts as long as
+    # the slowest validator rather than the sum of all of them
+    results = await asyncio.gather(
+        *(
+            dispatch_to_validator(
+                validator_id, validator_uri, data, task["id"], semaphore
+            )
+            for validator_id, validator_uri in temp_peers
+        ),
+        return_exceptions=True,
+    )
+    for (validator_id, _), result in zip(temp_peers, results):
+        if isinstance(result, Exception):
+            logging.error(
+                f"An error occurred while processing validator {validator_id}: {str(result)}"
+            )
+    logging.info(
+        f"Task {task['id']} acknowledged by {sum(result is True for result in results)} of {len(temp_peers)} validators."
+    )
+
+
 async def connect():
+    semaphore = asyncio.Semaphore(FANOUT_MAX_CONCURRENT)
     while True:
         try:
-            if not test_api_connection(base["INODE_INFO"]["URL"]):
+            if not await http_client.check_health_async(base["INODE_INFO"]["URL"]):
                 logging.error("Failed to establish API connection. Retrying...")
                 await asyncio.sleep(30)
                 continue
 
-            success, task_data = await select_task_for_validation()
+            success, task_data = await select_tasks_for_validation()
             if not success:
                 logging.info("No Task found for Validation. Retrying...")
                 await asyncio.sleep(60)
                 continue
 
-            task = json.loads(task_data)
+            tasks = json.loads(task_data)
 
             peers = read_peers("peers.json")
             if not peers:
@@ -189,82 +271,11 @@ async def connect():
                 await asyncio.sleep(60)
                 continue
 
-            # temp_peers will contain the validators uri to connect
-            temp_peers = [
-                (validator_id, validator_info)
-                for validator_id, validator_info in peers
-                if validator_id not in task.get("validators", [])
-            ]
-            processed_validators = set()
-
-            logging.info(f"temp_peers: {temp_peers}")
-
-            for validator_info in temp_peers[:]:
-                validator_id, validator_uri = validator_info
-                logging.info(
-                    f"Processing validator {validator_id} with URI {validator_uri}"
-                )
-                if validator_id in processed_validators:
-                    continue
-
-                data = json.dumps(
-                    {
-                        "val_id": task["id"],
-                        "pool_wallet": base["POOL_WALLETS"]["POOL_ADDRESS"],
-                        "task_info": task["array"],
-                        "type": "validateTask",
-                        "pool_ip": base["POOL_VALIDATION_SOCKET"]["IP"],
-                        "pool_port": base["POOL_VALIDATION_SOCKET"]["PORT"],
-                    }
-                )
-
-                try:
-
-                    response = await send_response_to_validator(validator_uri, data)
-                    logging.info(f"Response from validator {validator_id}: {response}")
-                    if response.startswith("ERROR:"):
-                        logging.error(
-                            f"Validator {validator_id} responded with error: {response}"
-                        )
-                        continue
-
-                    parsed_message = json.loads(response)
-
-                    message_type = parsed_message.get("type")
-
-                    if message_type == "taskReceived":
-                        val_id = parsed_message.get("val_id")
-                        validator_wallet = parsed_message.get("validator_wallet")
-
-                        update = add_processed_validator(val_id, validator_wallet)
-                        if update:
-                            logging.info(
-                                f"Task updated successfully for validator {validator_wallet}."
-                            )
-                        else:
-                            logging.info(
-                                f"Failed to update task for validator {validator_wallet}."
-                            )
-                    processed_validators.add(validator_id)
-                    temp_peers.remove(validator_info)
-
-                    temp_peers = [
-                        peer
-                        for peer in temp_peers
-                        if peer[0] not in processed_validators
-                    ]
-
-                except json.JSONDecodeError:
-                    logging.error(
-                        f"Failed to parse JSON response from validator {validator_id}."
-                    )
-                except Exception as e:
-                    logging.error(
-                        f"An error occurred while processing validator {validator_id}: {str(e)}"
-                    )
-
-                if not temp_peers:
-                    break
+            # Rounds share the semaphore, so MAX_CONCURRENT bounds the total
+            # number of validators being contacted
+            await asyncio.gather(
+                *(dispatch_round(task, peers, semaphore) for task in tasks)
+            )
 
             await asyncio.sleep(120)
 
@@ -274,6 +285,7 @@ async def connect():
 
 
 async def main():
+    await adb.run(seed_task_validity)
     balance_thread = threading.Thread(target=fetch_peer_periodically, daemon=True)
     balance_thread.start()
     start_server = websockets.serve(
@@ -287,12 +299,14 @@ async def main():
         await connect()
     finally:
         logging.info("Validation socket shutdown process starting.")
+        await connections.close_connections()
 
 
 if __name__ == "__main__":
     if not test_db_connection():
         logging.error("Failed to establish MongoDB connection. Exiting...")
         sys.exit(0)
+    ensure_indexes()
     if not test_api_connection(base["URLS"]["API_URL"]):
         logging.error("Failed to establish API connection. Exiting...")
         sys.exit(0)
@@ -1,6 +1,8 @@
 import requests
 import logging
 
+from api import http_client
+
 
 def fetch_all_delegate_info(api_url, validator, limit=1000):
     all_delegates = []
@@ -9,7 +11,7 @@ def fetch_all_delegate_info(api_url, validator, limit=1000):
         while True:
             full_url = f"{api_url}/get_delegates_info?validator={validator}&offset={offset}&limit={limit}"
             # print("full_url", full_url)
-            response = requests.get(full_url)
+            response = http_client.get(full_url)
             response.raise_for_status()
             data = response.json()
             if not data or len(data) < limit:
@@ -10,6 +10,9 @@ import json
 from api.fastapi import app
 from api.api_client import test_api_connection
 from database.mongodb import test_db_connection
+from database.indexes import ensure_indexes, required_indexes_applied
+from database import async_mongodb as adb
+from protocol import connections
 from utils.layout import base
 from protocol.protocol import (
     validator_protocol,
@@ -37,7 +40,8 @@ def run_fastapi():
 async def periodic_process_transactions():
     try:
         while True:
-            process_block_rewards()
+            # Block ingest makes blocking API and database calls
+            await asyncio.to_thread(process_block_rewards)
             await asyncio.sleep(base["TIME"]["CHECK_INTERVAL"])
     except Exception as e:
         print(f"Error in periodic_process_transactions: {e}")
@@ -46,7 +50,7 @@ async def periodic_process_transactions():
 async def periodic_process_validate_task():
     try:
         while True:
-            result, message = validate_tasks()
+            result, message = await adb.run(validate_tasks)
             if result:
                 logging.info(f"SUCESS: Validating Task: {result}")
             else:
@@ -87,7 +91,7 @@ async def periodic_send_ping():
 
 async def periodic_send_task_to_iNode():
     while True:
-        success, result = find_inode_task()
+        success, result = await adb.run(find_inode_task)
         if success:
             # Ensure result is loaded into JSON if it's not already a dictionary
             if isinstance(result, str):
@@ -114,7 +118,7 @@ async def periodic_send_task_to_iNode():
 
 async def periodic_send_task_to_pool():
     while True:
-        success, result = find_pool_task()
+        success, result = await adb.run(find_pool_task)
         if success:
             logging.info("Sending back validated task info to pool")
             # Ensure result is loaded into JSON if it's not already a dictionary
@@ -186,6 +190,7 @@ async def main():
             periodic_pool_task,
             return_exceptions=True,
         )
+        await connections.close_connections()
         logging.info("Validator shutdown process complete.")
 
 
@@ -193,6 +198,9 @@ if __name__ == "__main__":
     if not test_db_connection():
         logging.error("Failed to establish MongoDB connection. Exiting...")
         sys.exit(1)
+    if not required_indexes_applied(ensure_indexes()):
+        logging.error("Failed to apply the required MongoDB indexes. Exiting...")
+        sys.exit(3)
     if not test_api_connection(base["URLS"]["API_URL"]):
         logging.error("Failed to establish API connection. Exiting...")
         sys.exit(2)
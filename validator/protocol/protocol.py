@@ -9,6 +9,8 @@ import os
 import logging
 import base58
 from task.task import handle_pool_response, delete_inode_task, delete_pool_task
+from database import async_mongodb as adb
+from protocol import connections
 from utils.layout import base
 
 logging.basicConfig(
@@ -75,14 +77,11 @@ async def validator_protocol(websocket):
                             ],
                         }
                     )
+                    # The connection stays open for the pool's next task
                     if success:
                         await websocket.send(data)
-                        await websocket.close()
-                        active_connections.discard(websocket)
                     else:
                         await websocket.send(f"ERROR: {message}")
-                        await websocket.close()
-                        active_connections.discard(websocket)
 
                 elif message_type == "PING":
                     await websocket.send("SUCCESS: Ping")
@@ -108,18 +107,14 @@ async def validator_protocol(websocket):
 async def send_response_to_pool(pool_info, message, val_id):
     uri = pool_info
     try:
-        async with websockets.connect(uri) as websocket:
-            logging.info(f"Successfully connected with pool: {uri}")
-            await websocket.send(message)
-            response = await asyncio.wait_for(websocket.recv(), timeout=60)
-            await websocket.close()
-            if response.startswith("SUCCESS:"):
-                logging.info(f"Pool response: Accepted scores")
-                output = delete_pool_task(val_id)
-                logging.info(f"{output}")
-            else:
-                logging.error(f"Pool response: {response}")
-            return
+        response = await connections.request(uri, message, key=val_id)
+        if response.startswith("SUCCESS:"):
+            logging.info(f"Pool response: Accepted scores")
+            output = await adb.run(delete_pool_task, val_id)
+            logging.info(f"{output}")
+        else:
+            logging.error(f"Pool response: {response}")
+        return
     except asyncio.TimeoutError:
         logging.error(f"Timeout when sending message to {uri}")
     except Exception as e:
@@ -131,11 +126,8 @@ async def send_response_to_pool(pool_info, message, val_id):
 
 async def send_ping_to_iNode(uri, message):
     try:
-        async with websockets.connect(uri) as websocket:
-            logging.info(f"Connected for PING: {uri}")
-            await websocket.send(message)
-            response = await asyncio.wait_for(websocket.recv(), timeout=60)
-            logging.info(f"iNode Ping response: {response}")
+        response = await connections.request(uri, message)
+        logging.info(f"iNode Ping response: {response}")
     except asyncio.TimeoutError:
         logging.error(f"Timeout when sending PING to {uri}")
     except Exception as e:
@@ -145,18 +137,14 @@ async def send_ping_to_iNode(uri, message):
 
 async def send_task_to_iNode(uri, message, val_id):
     try:
-        async with websockets.connect(uri) as websocket:
-            logging.info(f"Connected for iNode task: {uri}")
-            await websocket.send(message)
-            response = await asyncio.wait_for(websocket.recv(), timeout=60)
-            await websocket.close()
-            if response.startswith("SUCCESS:"):
-                # Delete the task
-                output = delete_inode_task(val_id)
-                logging.info(f"{output}")
-            else:
-                logging.info(f"iNode Task response: {response}")
-            return
+        response = await connections.request(uri, message, key=val_id)
+        if response.startswith("SUCCESS:"):
+            # Delete the task
+            output = await adb.run(delete_inode_task, val_id)
+            logging.info(f"{output}")
+        else:
+            logging.info(f"iNode Task response: {response}")
+        return
     except asyncio.TimeoutError:
         logging.error(f"Timeout when sending task to {uri}")
     except Exception as e:
@@ -1,5 +1,6 @@
 from faker import Faker
 from database.mongodb import storeTasks, poolTasks, iNodeTask
+from database import async_mongodb as adb
 from datetime import datetime, timedelta
 import uuid_utils as uuid
 import json
@@ -18,7 +19,7 @@ logging.basicConfig(
 async def handle_pool_response(val_id, task_info, pool_wallet, pool_ip, pool_port):
     try:
         # Check if val_id already exists
-        existing_document = storeTasks.find_one({"val_id": val_id})
+        existing_document = await adb.storeTasks.find_one({"val_id": val_id})
         if existing_document:
             return (
                 False,
@@ -39,7 +40,7 @@ async def handle_pool_response(val_id, task_info, pool_wallet, pool_ip, pool_por
         ]
 
         # Insert document
-        storeTasks.insert_one(
+        await adb.storeTasks.insert_one(
             {
                 "val_id": val_id,
                 "pool_wallet": pool_wallet,